@@ -1,6 +1,8 @@
 """The Fan Master Modbus Integration."""
 import asyncio
 import logging
+import re
+import time
 from typing import Optional
 
 import voluptuous as vol
@@ -8,9 +10,14 @@ import voluptuous as vol
 import homeassistant.helpers.config_validation as cv
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_NAME, CONF_HOST, CONF_PORT, CONF_SCAN_INTERVAL
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.util import dt as dt_util
 
 from .fanmaster import FanMaster
+from .topology import FanMasterTopology
+from .scheduler import FanMasterPollCoordinator
 
 from .const import (
     DOMAIN,
@@ -18,12 +25,34 @@ from .const import (
     DEFAULT_SCAN_INTERVAL,
     DEFAULT_MODBUS_ADDRESS,
     DEFAULT_ACTIVE_DEVICES,
+    DEFAULT_TRANSPORT,
+    DEFAULT_PIPELINE_WINDOW,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    TRANSPORTS,
+    DATA_COORDINATOR,
     CONF_MODBUS_ADDRESS,
     CONF_ACTIVE_DEVICES,
+    CONF_TRANSPORT,
+    CONF_PIPELINE_WINDOW,
+    CONF_MAX_SCAN_INTERVAL,
+    MAX_DEVICES,
+    HISTORY_KEYS,
+    HISTORY_DEFAULT_DURATION,
+    SERVICE_GET_HISTORY,
+    ATTR_HUB,
+    ATTR_SLAVES,
+    ATTR_KEYS,
+    ATTR_START,
+    ATTR_END,
+    ATTR_RESOLUTION,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
+#unique id of the entities of a fan device, the location sensors of the hub are "<name>_location_<address>"
+FAN_DEVICE_UNIQUE_ID = re.compile(r"^fan_location_(\d+)_")
+FAN_DEVICE_IDENTIFIER_PREFIX = "fan_slave_"
+
 FAN_MASTER_SCHEMA = vol.Schema(
     {
         vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
@@ -32,6 +61,9 @@ FAN_MASTER_SCHEMA = vol.Schema(
         vol.Optional(CONF_MODBUS_ADDRESS, default=DEFAULT_MODBUS_ADDRESS): cv.positive_int,
         vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): cv.positive_int,
         vol.Optional(CONF_ACTIVE_DEVICES, default=DEFAULT_ACTIVE_DEVICES): cv.positive_int,
+        vol.Optional(CONF_TRANSPORT, default=DEFAULT_TRANSPORT): vol.In(TRANSPORTS),
+        vol.Optional(CONF_PIPELINE_WINDOW, default=DEFAULT_PIPELINE_WINDOW): cv.positive_int,
+        vol.Optional(CONF_MAX_SCAN_INTERVAL, default=DEFAULT_MAX_SCAN_INTERVAL): cv.positive_int,
     }
 )
 
@@ -39,12 +71,59 @@ CONFIG_SCHEMA = vol.Schema(
     {DOMAIN: vol.Schema({cv.slug: FAN_MASTER_SCHEMA})}, extra=vol.ALLOW_EXTRA
 )
 
+GET_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_HUB): cv.string,
+        vol.Required(ATTR_SLAVES): vol.All(
+            cv.ensure_list, [vol.All(vol.Coerce(int), vol.Range(min=1, max=MAX_DEVICES))]
+        ),
+        vol.Optional(ATTR_KEYS, default=HISTORY_KEYS): vol.All(cv.ensure_list, [vol.In(HISTORY_KEYS)]),
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_RESOLUTION): cv.positive_int,
+    }
+)
+
 PLATFORMS = ["number", "switch", "sensor", "binary_sensor", "climate"]
 
 
 async def async_setup(hass, config):
     """Set up the Fan Master modbus component."""
-    hass.data[DOMAIN] = {}
+    #the hubs are kept by name, next to the poll coordinator of all hubs
+    hass.data[DOMAIN] = {DATA_COORDINATOR: FanMasterPollCoordinator(hass)}
+
+    async def async_get_history(call: ServiceCall):
+        """return the in-memory history of fan devices, it is not written to the recorder"""
+        hubs = {name: data for name, data in hass.data[DOMAIN].items() if name != DATA_COORDINATOR}
+        hub_name = call.data.get(ATTR_HUB)
+        if hub_name is None and len(hubs) == 1:
+            hub_name = next(iter(hubs))
+        if hub_name not in hubs:
+            raise HomeAssistantError(f"unknown Fan Master hub {hub_name}, configured: {', '.join(hubs)}")
+
+        end = dt_util.as_timestamp(call.data[ATTR_END]) if ATTR_END in call.data else time.time()
+        start = (
+            dt_util.as_timestamp(call.data[ATTR_START]) if ATTR_START in call.data
+            else end - HISTORY_DEFAULT_DURATION
+        )
+        history = hubs[hub_name]["hub"].get_history(
+            call.data[ATTR_SLAVES], call.data[ATTR_KEYS], start, end, call.data.get(ATTR_RESOLUTION)
+        )
+        return {
+            ATTR_HUB: hub_name,
+            ATTR_SLAVES: {
+                str(address): {
+                    key: [[dt_util.utc_from_timestamp(timestamp).isoformat(), value] for timestamp, value in samples]
+                    for key, samples in fields.items()
+                }
+                for address, fields in history.items()
+            },
+        }
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_GET_HISTORY, async_get_history,
+        schema=GET_HISTORY_SCHEMA, supports_response=SupportsResponse.ONLY
+    )
     return True
 
 
@@ -55,7 +134,9 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     port = entry.data[CONF_PORT]
     address = entry.data.get(CONF_MODBUS_ADDRESS, 1)
     scan_interval = entry.data[CONF_SCAN_INTERVAL]
-    devices = entry.data.get(CONF_ACTIVE_DEVICES, DEFAULT_ACTIVE_DEVICES)
+    transport = entry.data.get(CONF_TRANSPORT, DEFAULT_TRANSPORT)
+    pipeline_window = entry.data.get(CONF_PIPELINE_WINDOW, DEFAULT_PIPELINE_WINDOW)
+    max_scan_interval = entry.data.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL)
 
     _LOGGER.debug("Setup %s.%s", DOMAIN, name)
 
@@ -66,10 +147,15 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         port,
         address,
         scan_interval,
-        devices
+        transport=transport,
+        pipeline_window=pipeline_window,
+        max_scan_interval=max_scan_interval,
+        coordinator=hass.data[DOMAIN][DATA_COORDINATOR]
     )
     """Register the hub."""
     hass.data[DOMAIN][name] = {"hub": hub}
+    #the entities of the fan devices known from the last run are created right away
+    await hub.async_load_topology()
 
     #for component in PLATFORMS:
     #    hass.async_create_task(
@@ -77,10 +163,73 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     #    )
     
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
-    
+
+    #the platforms add the entities of newly coded fan devices, removed devices are cleaned up here
+    @callback
+    def async_device_changed(device, added):
+        if not added:
+            async_remove_fan_device(hass, name, device.address)
+            #a unit coded again later starts without the values of the removed device
+            hub.deadband.forget(device.address)
+
+    entry.async_on_unload(hub.async_add_device_listener(async_device_changed))
+
+    #entries left from a former run or version for fan devices that are not coded are removed once
+    @callback
+    def async_coding_list_read():
+        if hub.data.get("codingInvalid") is not False:
+            return
+        hub.async_remove_fanmaster_sensor(async_coding_list_read)
+        async_prune_fan_devices(hass, entry, hub.slaves.addresses())
+
+    hub.async_add_fanmaster_sensor(async_coding_list_read, None, ["mastercodinglist", "codingInvalid"])
+    entry.async_on_unload(lambda: hub.async_remove_fanmaster_sensor(async_coding_list_read))
     return True
 
 
+@callback
+def async_prune_fan_devices(hass, entry, coded):
+    """remove the devices and entities of the entry that belong to fan devices not in coded"""
+    name = entry.data[CONF_NAME]
+    device_registry = dr.async_get(hass)
+    for device in dr.async_entries_for_config_entry(device_registry, entry.entry_id):
+        for identifier in device.identifiers:
+            if (identifier[0] == DOMAIN and len(identifier) == 3 and identifier[2].startswith(FAN_DEVICE_IDENTIFIER_PREFIX)
+                    and int(identifier[2][len(FAN_DEVICE_IDENTIFIER_PREFIX):]) not in coded):
+                _LOGGER.info(f"remove {identifier[2]} from the device registry as its not part of coding")
+                device_registry.async_remove_device(device.id)
+                break
+
+    entity_registry = er.async_get(hass)
+    location_prefix = f"{name}_location_"
+    for entity in er.async_entries_for_config_entry(entity_registry, entry.entry_id):
+        match = FAN_DEVICE_UNIQUE_ID.match(entity.unique_id)
+        if match is not None:
+            address = match.group(1)
+        elif entity.unique_id.startswith(location_prefix):
+            address = entity.unique_id[len(location_prefix):]
+        else:
+            continue
+        if address.isdigit() and int(address) not in coded:
+            entity_registry.async_remove(entity.entity_id)
+
+
+@callback
+def async_remove_fan_device(hass, name, address):
+    """remove the device and the entities of a fan device that is no longer coded"""
+    device_registry = dr.async_get(hass)
+    device = device_registry.async_get_device(identifiers={(DOMAIN, name, f"{FAN_DEVICE_IDENTIFIER_PREFIX}{address}")})
+    if device is not None:
+        #removes the entities of the device as well
+        device_registry.async_remove_device(device.id)
+
+    #the location sensor belongs to the hub device
+    entity_registry = er.async_get(hass)
+    entity_id = entity_registry.async_get_entity_id("sensor", DOMAIN, f"{name}_location_{address}")
+    if entity_id is not None:
+        entity_registry.async_remove(entity_id)
+
+
 async def async_unload_entry(hass, entry):
     """Unload Fan Master mobus entry."""
     
@@ -97,4 +246,9 @@ async def async_unload_entry(hass, entry):
         return False
 
     hass.data[DOMAIN].pop(entry.data["name"])
-    return True
\ No newline at end of file
+    return True
+
+
+async def async_remove_entry(hass, entry):
+    """Remove the cached topology of a removed Fan Master entry."""
+    await FanMasterTopology(hass, entry.data[CONF_NAME]).async_remove()
@@ -46,9 +46,16 @@ async def async_setup_entry(hass, entry, async_add_entities):
             )
             entities.append(sensor)
     
-    #Temp solution: create sensors as configured
-    for slave in hub.slaves:
-        slave_name = f"fan_slave_{slave._address}"
+    async_add_entities(entities)
+
+    @callback
+    def async_add_fan_device(device, added):
+        """create the entities of a newly coded fan device"""
+        if not added:
+            return
+        address = device.address
+        entities = []
+        slave_name = f"fan_slave_{address}"
         slave_device_info = {
             "identifiers": {(DOMAIN, conf_name, slave_name)},
             "name": slave_name,
@@ -60,7 +67,7 @@ async def async_setup_entry(hass, entry, async_add_entities):
                 sensor = FanDeviceBinarySensor(
                     conf_name,
                     hub,
-                    slave._address,
+                    device,
                     slave_device_info,
                     slave_sensor_info[1],
                     slave_sensor_info[2],
@@ -70,7 +77,9 @@ async def async_setup_entry(hass, entry, async_add_entities):
                 )
                 entities.append(sensor)
 
-    async_add_entities(entities)
+        async_add_entities(entities)
+
+    entry.async_on_unload(hub.async_add_device_listener(async_add_fan_device))
     return True
 
 
@@ -85,11 +94,13 @@ class BinarySensorBase(BinarySensorEntity):
         self._name = name
         self._icon = icon
         self._device_info = device_info
+        self._deviceID = None
+        self._device = None
         self._attr_device_class = deviceclass
 
     async def async_added_to_hass(self):
         """Register callbacks."""
-        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated)
+        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated, self._deviceID, [self._key])
 
     async def async_will_remove_from_hass(self) -> None:
         self._hub.async_remove_fanmaster_sensor(self._modbus_data_updated)
@@ -113,6 +124,13 @@ class BinarySensorBase(BinarySensorEntity):
         """Data is delivered by the hub"""
         return False
 
+    @property
+    def available(self) -> bool:
+        """Return True if the device delivered data within the modbus timeout."""
+        if self._device is not None:
+            return self._device.available
+        return self._hub.available
+
     @property
     def device_info(self) -> Optional[Dict[str, Any]]:
         return self._device_info
@@ -152,10 +170,11 @@ class FanMasterBinarySensor(BinarySensorBase):
 class FanDeviceBinarySensor(BinarySensorBase):
     """Representation of an binary Fan Device sensor."""
     
-    def __init__(self, platform_name, hub, device_id, device_info, name, key, deviceclass, icon):
+    def __init__(self, platform_name, hub, device, device_info, name, key, deviceclass, icon):
         """Initialize the sensor."""
         super().__init__(platform_name, hub, device_info, name, key, deviceclass, icon)
-        self._deviceID = device_id
+        self._device = device
+        self._deviceID = device.address
         
     @property
     def name(self):
@@ -172,9 +191,6 @@ class FanDeviceBinarySensor(BinarySensorBase):
     @property
     def state(self):
         """Return the state of the sensor."""
-        try: 
-            if self._key in self._hub.slaves[self._deviceID-1].data:
-                _attr_is_on = self._hub.slaves[self._deviceID-1].data[self._key]
-                return self._hub.slaves[self._deviceID-1].data[self._key]
-        except IndexError:
-            return None
\ No newline at end of file
+        if self._key in self._device.data:
+            _attr_is_on = self._device.data[self._key]
+            return self._device.data[self._key]
\ No newline at end of file
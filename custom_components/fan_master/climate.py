@@ -25,6 +25,7 @@ from homeassistant.const import (
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
+_LOGGER = logging.getLogger(__name__)
 
 OPERATION_LIST = [HVACMode.HEAT, HVACMode.OFF, HVACMode.AUTO, HVACMode.COOL, HVACMode.FAN_ONLY]
 
@@ -64,10 +65,15 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
         "manufacturer": ATTR_MANUFACTURER,
     }
 
-    entities = []
     
-    for slave in hub.slaves:
-        slave_name = f"fan_slave_{slave._address}"
+    @callback
+    def async_add_fan_device(device, added):
+        """create the entities of a newly coded fan device"""
+        if not added:
+            return
+        address = device.address
+        entities = []
+        slave_name = f"fan_slave_{address}"
         slave_device_info = {
             "identifiers": {(DOMAIN, conf_name, slave_name)},
             "name": slave_name,
@@ -78,7 +84,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
             climate = FanDeviceClimate(
                 conf_name,
                 hub,
-                slave._address,
+                device,
                 slave_device_info,
                 climate_info[0], #name
                 climate_info[1], #modbusadress
@@ -95,7 +101,9 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
             )
             entities.append(climate)
 
-    async_add_entities(entities)
+        async_add_entities(entities)
+
+    entry.async_on_unload(hub.async_add_device_listener(async_add_fan_device))
     return True
 
 
@@ -104,11 +112,12 @@ class FanDeviceClimate(ClimateEntity):
     _attr_supported_features = (ClimateEntityFeature.TURN_OFF | ClimateEntityFeature.TURN_ON)
     _enable_turn_on_off_backwards_compatibility = False
     
-    def __init__(self, platform_name, hub, device_id, device_info, name, address, unit, keyList, states) -> None:
+    def __init__(self, platform_name, hub, device, device_info, name, address, unit, keyList, states) -> None:
         """Initialize the selector."""
         self._platform_name = platform_name
         self._hub = hub
-        self._deviceID = device_id
+        self._device = device
+        self._deviceID = device.address
         self._device_info = device_info
         self._name = name
         self._address = address
@@ -120,7 +129,7 @@ class FanDeviceClimate(ClimateEntity):
        
     async def async_added_to_hass(self):
         """Register callbacks."""
-        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated)
+        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated, self._deviceID, list(self._keyList.values()))
 
     async def async_will_remove_from_hass(self) -> None:
         self._hub.async_remove_fanmaster_sensor(self._modbus_data_updated)
@@ -132,6 +141,11 @@ class FanDeviceClimate(ClimateEntity):
     @property
     def device_info(self) -> Optional[Dict[str, Any]]:
         return self._device_info
+
+    @property
+    def available(self) -> bool:
+        """Return True if the device delivered data within the modbus timeout."""
+        return self._device.available
     
     @property
     def name(self):
@@ -148,13 +162,10 @@ class FanDeviceClimate(ClimateEntity):
     @property
     def current_temperature(self) -> float:
         """Return the current room temperature."""
-        try: 
-            if self._keyList["roomtemp"] in self._hub.slaves[self._deviceID-1].data:
-                temp = self._hub.slaves[self._deviceID-1].data[self._keyList["roomtemp"]]
-                if (temp == "Error"):   return None
-                else:                   return temp
-        except IndexError:
-            return None
+        if self._keyList["roomtemp"] in self._device.data:
+            temp = self._device.data[self._keyList["roomtemp"]]
+            if (temp == "Error"):   return None
+            else:                   return temp
 
     #@property
     #def target_temperature(self) -> float:
@@ -180,16 +191,13 @@ class FanDeviceClimate(ClimateEntity):
     @property
     def hvac_mode(self) -> HVACMode:
         """Return the current operation mode."""
-        try: 
-            if self._keyList["hvac"] in self._hub.slaves[self._deviceID-1].data:
-                hvacValue = self._hub.slaves[self._deviceID-1].data[self._keyList["hvac"]]
-                if (hvacValue == self._stateValues["auto"]): return HVACMode.AUTO
-                elif (hvacValue == self._stateValues["boost"]): return HVACMode.FAN_ONLY
-                elif (hvacValue == self._stateValues["cooling"]): return HVACMode.COOL
-                elif (hvacValue == self._stateValues["heating"]): return HVACMode.HEAT
-                elif (hvacValue == self._stateValues["off"]): return HVACMode.OFF
-                return None
-        except IndexError:
+        if self._keyList["hvac"] in self._device.data:
+            hvacValue = self._device.data[self._keyList["hvac"]]
+            if (hvacValue == self._stateValues["auto"]): return HVACMode.AUTO
+            elif (hvacValue == self._stateValues["boost"]): return HVACMode.FAN_ONLY
+            elif (hvacValue == self._stateValues["cooling"]): return HVACMode.COOL
+            elif (hvacValue == self._stateValues["heating"]): return HVACMode.HEAT
+            elif (hvacValue == self._stateValues["off"]): return HVACMode.OFF
             return None
 
     @property
@@ -206,9 +214,9 @@ class FanDeviceClimate(ClimateEntity):
         elif (hvac_mode == HVACMode.HEAT):      hvacValue = self._stateValues["heating"] 
         elif (hvac_mode == HVACMode.OFF):       hvacValue = self._stateValues["off"] 
         
-        response = self._hub.write_register(unit=self._deviceID, address=self._address, payload=hvacValue)
-        if response.isError():
-            _LOGGER.error(f"Could not write value {value} to location_{self._deviceID} {self._key}")
+        applied = await self._hub.async_write_register(unit=self._deviceID, address=self._address, payload=hvacValue)
+        if not applied:
+            _LOGGER.error(f"Could not write value {hvacValue} to location_{self._deviceID} {self._keyList['hvac']}")
             return
         
 
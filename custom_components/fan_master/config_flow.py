@@ -11,9 +11,14 @@ from .const import (
     DEFAULT_SCAN_INTERVAL,
     DEFAULT_PORT,
     DEFAULT_MODBUS_ADDRESS,
-    DEFAULT_ACTIVE_DEVICES,
+    DEFAULT_TRANSPORT,
+    DEFAULT_PIPELINE_WINDOW,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    TRANSPORTS,
     CONF_MODBUS_ADDRESS,
-    CONF_ACTIVE_DEVICES
+    CONF_TRANSPORT,
+    CONF_PIPELINE_WINDOW,
+    CONF_MAX_SCAN_INTERVAL
 )
 from homeassistant.core import HomeAssistant, callback
 
@@ -24,7 +29,9 @@ DATA_SCHEMA = vol.Schema(
         vol.Required(CONF_PORT, default=DEFAULT_PORT): int,
         vol.Optional(CONF_MODBUS_ADDRESS, default=DEFAULT_MODBUS_ADDRESS): int,
         vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): int,
-        vol.Optional(CONF_ACTIVE_DEVICES, default=DEFAULT_ACTIVE_DEVICES): int,
+        vol.Optional(CONF_TRANSPORT, default=DEFAULT_TRANSPORT): vol.In(TRANSPORTS),
+        vol.Optional(CONF_PIPELINE_WINDOW, default=DEFAULT_PIPELINE_WINDOW): int,
+        vol.Optional(CONF_MAX_SCAN_INTERVAL, default=DEFAULT_MAX_SCAN_INTERVAL): int,
     }
 )
 
@@ -0,0 +1,180 @@
+import logging
+import random
+import socket
+from collections import deque
+from datetime import datetime
+
+from homeassistant.core import callback
+
+from .const import (
+    CONNECTION_STATE_CONNECTED, CONNECTION_STATE_CONNECTING, CONNECTION_STATE_DISCONNECTED,
+    RECONNECT_BACKOFF_MIN, RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_JITTER,
+    KEEPALIVE_IDLE, KEEPALIVE_INTERVAL, KEEPALIVE_COUNT, LIVENESS_IDLE_TIME, LIVENESS_MAX_TIMEOUTS,
+    CONNECTION_HISTORY_SIZE
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def enable_keepalive(sock):
+    """let the OS detect a dead gateway on an idle connection"""
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        #the timing options are not available on every platform
+        for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE), ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                              ("TCP_KEEPCNT", KEEPALIVE_COUNT)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+    except OSError as e:
+        _LOGGER.debug(f'TCP keepalive not enabled: {e}')
+
+
+class FanMasterConnection:
+    """Connection health of a hub: reconnects with backoff and a liveness probe.
+
+    While the gateway is down, a cycle only costs a look at the backoff time,
+    reconnects are tried after an exponential backoff with jitter. Before a
+    cycle on an idle connection and after several requests without response,
+    a single register of the master is read, so a dead connection is closed
+    instead of every block of the cycle running into the timeout.
+    """
+
+    def __init__(self, hass, transport, metrics, probe, state_callback):
+        """Initialize the connection manager.
+
+        probe is a coroutine function reading one register of the master, returns True on a response,
+        state_callback is called whenever the connection state changes
+        """
+        self._hass = hass
+        self._transport = transport
+        self._metrics = metrics
+        self._probe = probe
+        self._state_callback = state_callback
+        self.state = CONNECTION_STATE_DISCONNECTED
+        self.failures = 0
+        self.last_error = None
+        self.state_since = datetime.now()
+        #last state changes as (time, state, error), oldest first
+        self.history = deque(maxlen=CONNECTION_HISTORY_SIZE)
+        self._next_attempt = 0.0
+        self._last_response = None
+        self._timeouts = 0
+        self._probing = False
+        #a connect is counted as reconnect once the hub was connected before
+        self._was_connected = False
+
+    @property
+    def attributes(self):
+        """Return the details of the connection state."""
+        return {
+            "since": self.state_since.isoformat(),
+            "failed_attempts": self.failures,
+            "last_error": self.last_error,
+            "retry_in": (
+                round(max(0.0, self._next_attempt - self._hass.loop.time()), 1)
+                if self.state == CONNECTION_STATE_DISCONNECTED and self.failures else None
+            ),
+        }
+
+    @callback
+    def _set_state(self, state, error=None):
+        if state != self.state:
+            self.state = state
+            self.state_since = datetime.now()
+            self.history.append((self.state_since, state, error))
+            self._state_callback()
+
+    async def async_ensure_connected(self):
+        """return True if the connection is usable for a cycle, connects if the backoff expired"""
+        if self._transport.connected:
+            if self.state != CONNECTION_STATE_CONNECTED:
+                self._set_state(CONNECTION_STATE_CONNECTED)
+            if self._last_response is None or self._hass.loop.time() - self._last_response > LIVENESS_IDLE_TIME:
+                return await self.async_check_liveness()
+            return True
+
+        if self.state == CONNECTION_STATE_CONNECTED:
+            #connection lost, the first reconnect is tried right away
+            _LOGGER.info("modbus client is not connected, trying to reconnect")
+            self._set_state(CONNECTION_STATE_DISCONNECTED, "connection lost")
+            self._next_attempt = 0.0
+        if self._hass.loop.time() < self._next_attempt:
+            return False
+        return await self._async_connect()
+
+    async def _async_connect(self):
+        self._set_state(CONNECTION_STATE_CONNECTING)
+        try:
+            connected = await self._transport.async_connect()
+            error = None if connected else "connect failed"
+        except Exception as e:
+            connected = False
+            error = str(e) or type(e).__name__
+
+        if connected:
+            if self.failures:
+                _LOGGER.info(f'reconnected to {self._transport.host}:{self._transport.port} after {self.failures} failed attempt(s)')
+            else:
+                _LOGGER.info("successfully connected to %s:%s", self._transport.host, self._transport.port)
+            enable_keepalive(self._transport.socket)
+            if self._was_connected:
+                self._metrics.record_reconnect()
+            self._was_connected = True
+            #the failures are reset by the first response, a gateway that accepts but does not respond keeps backing off
+            self._timeouts = 0
+            self._last_response = self._hass.loop.time()
+            self._set_state(CONNECTION_STATE_CONNECTED)
+            return True
+
+        self._backoff(error)
+        return False
+
+    def _backoff(self, error):
+        self.failures += 1
+        self.last_error = error
+        delay = min(RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_MIN * 2 ** (self.failures - 1))
+        delay *= 1 - RECONNECT_BACKOFF_JITTER * random.random()
+        self._next_attempt = self._hass.loop.time() + delay
+        #only the first failure is a warning, the following ones would flood the log
+        log = _LOGGER.warning if self.failures == 1 else _LOGGER.debug
+        log(f'not able to connect to {self._transport.host}:{self._transport.port} ({error}), next attempt in {delay:.1f}s')
+        self._set_state(CONNECTION_STATE_DISCONNECTED, error)
+
+    async def async_check_liveness(self):
+        """read one register of the master, closes the connection if it does not respond"""
+        self._probing = True
+        try:
+            alive = await self._probe()
+        except Exception as e:
+            _LOGGER.debug(f'liveness probe failed: {e}')
+            alive = False
+        finally:
+            self._probing = False
+        if alive:
+            return True
+        log = _LOGGER.warning if not self.failures else _LOGGER.debug
+        log(f'{self._transport.host}:{self._transport.port} does not respond, closing the connection')
+        await self._transport.async_close()
+        self._backoff("no response")
+        return False
+
+    @callback
+    def record_response(self):
+        """note a response of the gateway, also an error response"""
+        self._last_response = self._hass.loop.time()
+        self._timeouts = 0
+        if self.failures:
+            self.failures = 0
+            self.last_error = None
+            self._state_callback()
+
+    async def async_record_timeout(self):
+        """note a request without response, returns False once the gateway itself does not respond anymore"""
+        self._timeouts += 1
+        if self._probing or self._timeouts < LIVENESS_MAX_TIMEOUTS:
+            return True
+        #the fan devices may not answer, the master has to
+        self._timeouts = 0
+        return await self.async_check_liveness()
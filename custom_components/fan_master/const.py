@@ -3,6 +3,8 @@ from homeassistant.components.binary_sensor import BinarySensorDeviceClass
 from homeassistant.components.number import NumberDeviceClass
 from homeassistant.const import (
     UnitOfTemperature,
+    UnitOfTime,
+    UnitOfInformation,
 )
 
 DOMAIN = "fan_master"
@@ -11,13 +13,30 @@ DEFAULT_SCAN_INTERVAL = 5
 DEFAULT_PORT = 502
 DEFAULT_MODBUS_ADDRESS = 0
 DEFAULT_MODBUS_TIMEOUT = 30
-DEFAULT_ACTIVE_DEVICES = 2 #temporaty solution until auto detect works
+DEFAULT_ACTIVE_DEVICES = 2 #only for old configurations, the fan devices are taken from the coding list
 MAX_DEVICES = 30
 
 ATTR_STATUS_DESCRIPTION = "status_description"
 ATTR_MANUFACTURER = "M Engineering"
 CONF_MODBUS_ADDRESS = "modbus_address"
-CONF_ACTIVE_DEVICES = "number_slaves" #temporary solution until auto detect works
+CONF_ACTIVE_DEVICES = "number_slaves" #only for old configurations, the fan devices are taken from the coding list
+CONF_TRANSPORT = "transport"
+CONF_PIPELINE_WINDOW = "pipeline_window"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
+
+TRANSPORT_SYNC = "sync" #pymodbus sync client, requests run in the executor
+TRANSPORT_ASYNC = "async" #pymodbus asyncio client, requests run on the event loop
+TRANSPORT_PIPELINED = "pipelined" #own asyncio client, several requests to different units in flight
+TRANSPORTS = [TRANSPORT_SYNC, TRANSPORT_ASYNC, TRANSPORT_PIPELINED]
+DEFAULT_TRANSPORT = TRANSPORT_SYNC
+DEFAULT_PIPELINE_WINDOW = 4 #max requests in flight of the pipelined transport
+REQUEST_TIMEOUT = 3 #[s] max time for the response of a modbus request
+REQUEST_RETRIES = 1 #retries of a request without response by the pymodbus clients, a dead gateway is found by the liveness probe
+DEFAULT_MAX_SCAN_INTERVAL = 30 #[s] the poll interval is stretched up to this if the cycles take longer than the scan interval
+POLL_INTERVAL_HEADROOM = 1.25 #poll interval relative to the average cycle duration
+POLL_INTERVAL_SMOOTHING = 0.2 #weight of the last cycle duration in the average
+MAX_CONCURRENT_CYCLES = 2 #poll cycles of different hubs running at the same time
+DATA_COORDINATOR = "fan_master_coordinator" #key of the poll coordinator of all hubs in hass.data[DOMAIN]
 
 #attributes: type(0=normal | 1=binary), name, key, unit, class, icon
 FANMASTER_SENSOR_TYPES = {
@@ -32,6 +51,43 @@ FANMASTER_SENSOR_TYPES = {
 }
 
 
+#diagnostic sensors of the hub performance, the values come from the metrics of the last poll cycle
+#attributes: name, key, unit, class, icon
+FANMASTER_METRIC_SENSOR_TYPES = {
+    "Metric_Cycle_Duration": ["Poll Cycle Duration", "cycle_duration", UnitOfTime.SECONDS, SensorDeviceClass.DURATION, "mdi:timer-outline"],
+    "Metric_Cycle_Transactions": ["Poll Cycle Transactions", "cycle_transactions", None, None, "mdi:swap-horizontal"],
+    "Metric_Cycle_Failed_Transactions": ["Poll Cycle Failed Transactions", "cycle_failed_transactions", None, None, "mdi:alert-circle-outline"],
+    "Metric_Cycle_Bytes": ["Poll Cycle Bytes Read", "cycle_bytes", UnitOfInformation.BYTES, SensorDeviceClass.DATA_SIZE, None],
+    "Metric_Slave_Latency": ["Slave Latency", "slave_latency", UnitOfTime.MILLISECONDS, SensorDeviceClass.DURATION, "mdi:timer-sand"],
+    "Metric_Reconnects": ["Reconnects", "reconnects", None, None, "mdi:lan-disconnect"],
+    "Metric_Overruns": ["Poll Cycle Overruns", "overruns", None, None, "mdi:timer-alert-outline"],
+    "Metric_Skipped_Cycles": ["Skipped Poll Cycles", "skipped_cycles", None, None, "mdi:debug-step-over"],
+    "Metric_Poll_Interval": ["Poll Interval", "poll_interval", UnitOfTime.SECONDS, SensorDeviceClass.DURATION, "mdi:timer-sync-outline"],
+}
+#metrics that count up since the start of the hub
+METRIC_TOTAL_KEYS = ["reconnects", "overruns", "skipped_cycles"]
+METRICS_WINDOW = 60 #number of poll cycles of the rolling metrics summary
+LATENCY_HISTOGRAM_BOUNDS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500] #[ms] upper bounds of the latency histogram buckets
+
+#connection to the gateway, the state is published by a diagnostic sensor
+CONNECTION_STATE_CONNECTED = "connected"
+CONNECTION_STATE_CONNECTING = "connecting"
+CONNECTION_STATE_DISCONNECTED = "disconnected"
+CONNECTION_STATES = [CONNECTION_STATE_CONNECTED, CONNECTION_STATE_CONNECTING, CONNECTION_STATE_DISCONNECTED]
+#attributes: name, key, unit, class, icon
+FANMASTER_CONNECTION_SENSOR_TYPE = ["Connection State", "connection_state", None, SensorDeviceClass.ENUM, "mdi:lan-connect"]
+RECONNECT_BACKOFF_MIN = 1 #[s] wait after the first failed connect, doubled with every further failure
+RECONNECT_BACKOFF_MAX = 60 #[s]
+RECONNECT_BACKOFF_JITTER = 0.5 #the wait is shortened randomly by up to this part, hubs do not retry in lockstep
+KEEPALIVE_IDLE = 30 #[s] idle time of the connection before the first TCP keepalive probe
+KEEPALIVE_INTERVAL = 10 #[s] between the TCP keepalive probes
+KEEPALIVE_COUNT = 3 #unanswered TCP keepalive probes until the connection is dropped
+LIVENESS_IDLE_TIME = 60 #[s] without response before a cycle checks the gateway with one register read
+LIVENESS_MAX_TIMEOUTS = 3 #requests in a row without response until the gateway is checked
+LIVENESS_PROBE_KEY = "codinglist" #master register read to check the gateway
+CONNECTION_HISTORY_SIZE = 20 #number of connection state changes kept for the diagnostics
+
+
 #attributes: type(0=normal | 1=binary), name, key, unit, class, icon
 FANDEVICE_SENSOR_TYPES = {
     "Slave_SW_Version": [0, "Software Version", "appl_sw_version", None, None, None],
@@ -77,4 +133,152 @@ FANDEVICE_NUMBER_TYPES = [
 FANDEVICE_SWITCH_TYPES = [
     ["Debug Mode", "debug", 22],
 ]
-    
\ No newline at end of file
+    
+#max number of registers of one read request (modbus limit)
+MAX_REGISTERS_PER_READ = 125
+#max number of unused registers a block read may span (the gateway rejects reads of unimplemented registers)
+MAX_REGISTER_GAP = 0
+
+#poll tiers of the registers and their poll interval [s] (fast = every scan interval)
+POLL_TIER_FAST = "fast"
+POLL_TIER_NORMAL = "normal"
+POLL_TIER_SLOW = "slow"
+POLL_TIER_STATIC = "static"
+POLL_TIER_INTERVALS = {
+    POLL_TIER_FAST: 0,
+    POLL_TIER_NORMAL: 30,
+    POLL_TIER_SLOW: 120,
+    POLL_TIER_STATIC: 3600,
+}
+POLL_TIER_RETRY_INTERVAL = 30 #[s] a tier with a failed block is read again after this time at the latest
+LOCATION_REFRESH_INTERVAL = POLL_TIER_INTERVALS[POLL_TIER_STATIC] #location strings are re-read after this time [s]
+
+#sleeping fan devices or devices with communication timeout are only polled on these status registers
+FANDEVICE_HEARTBEAT_KEYS = ["dtcactive", "commtimeout", "sleep"]
+SLEEP_HEARTBEAT_INTERVAL = 20 #[s], has to be below DEFAULT_MODBUS_TIMEOUT to keep the device available
+
+#status code of a decoded field, kept next to its value
+STATUS_OK = 0
+STATUS_NOT_READ = 1
+STATUS_INVALID = 2 #no current data, e.g. device timed out
+STATUS_ERROR = 3
+STATUS_NOT_ATTACHED = 4
+STATUS_DEFAULT = 5
+STATUS_NO_LOCATION = 6
+#value reported instead of a field with this status
+STATUS_TEXTS = {
+    STATUS_INVALID: None,
+    STATUS_ERROR: "Error",
+    STATUS_NOT_ATTACHED: "NotAttached",
+    STATUS_DEFAULT: "Default",
+    STATUS_NO_LOCATION: "no location in Parameter",
+}
+
+#fields of the fan devices kept in the in-memory history, a sample is stored whenever the field is read
+HISTORY_KEYS = [
+    "fan1rpm", "fan2rpm", "fan3rpm", "fan4rpm", "fan5rpm", "fan6rpm",
+    "fan7rpm", "fan8rpm", "fan9rpm", "fan10rpm", "fan11rpm",
+    "tempsupply", "tempreturn", "rssilast", "rssifiltered",
+]
+HISTORY_SIZE = 360 #samples per fan device and field (3h at the normal poll tier)
+HISTORY_DEFAULT_DURATION = 300 #[s] time window of the history service if no start is given
+
+SERVICE_GET_HISTORY = "get_history"
+ATTR_HUB = "hub"
+ATTR_SLAVES = "slaves"
+ATTR_KEYS = "keys"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_RESOLUTION = "resolution"
+
+#deadbands of noisy fields, a change is published once it is larger than the absolute deadband and
+#larger than the relative deadband (part of the last published value), smaller changes are held back
+#attributes: absolute, relative
+DEADBAND_TYPES = {
+    "temperature": [0.1, 0],
+    "humidity": [1, 0],
+    "rssi": [2, 0],
+    "rpm": [20, 0.02],
+}
+FIELD_DEADBANDS = {
+    **dict.fromkeys(
+        ["tempsupply", "tempsupplyraw", "tempreturn", "temproom", "dewpoint", "masterworstdewpoint", "masterlowestsupply"],
+        DEADBAND_TYPES["temperature"]
+    ),
+    "humidity": DEADBAND_TYPES["humidity"],
+    **dict.fromkeys(["rssilast", "rssifiltered"], DEADBAND_TYPES["rssi"]),
+    **dict.fromkeys([f"fan{i}rpm" for i in range(1, 12)], DEADBAND_TYPES["rpm"]),
+}
+DEADBAND_MAX_SILENCE = 300 #[s] a held back change is published if the field was not published for this time
+
+#last known topology of a hub in the Home Assistant storage, used to create the entities at startup
+TOPOLOGY_STORAGE_VERSION = 1
+TOPOLOGY_SAVE_DELAY = 30 #[s] changes are written at most once in this time
+
+#raw values the devices report instead of a measurement and their status code
+SENTINELS_TEMPERATURE = {32767: STATUS_ERROR}
+SENTINELS_DEWPOINT = {32765: STATUS_ERROR, 32767: STATUS_ERROR}
+SENTINELS_RPM = {65534: STATUS_NOT_ATTACHED, 65535: STATUS_ERROR}
+SENTINELS_SPEED = {65535: STATUS_ERROR}
+SENTINELS_BOOST = {0: STATUS_DEFAULT}
+SENTINELS_LOCATION = {"": STATUS_NO_LOCATION}
+#labels of the enum datatype, taken from the sentinels column
+ENUM_ACTIVE_MODE = {0: "Off", 1: "Boost", 2: "Heating", 3: "Cooling"}
+
+#register layout of the fan master, used to plan the block reads (location strings are read separately)
+#attributes: modbusadress, count, datatype, divider, sentinels, max, tier
+FANMASTER_REGISTER_TYPES = {
+    "sw_version": [0, 4, "u64", None, {}, None, POLL_TIER_STATIC],
+    "dtcactive": [3, 1, "bool", None, {}, None, POLL_TIER_FAST],
+    "codinglist": [10, 2, "u32", None, {}, None, POLL_TIER_NORMAL], #drives the device list
+    "masterworstdewpoint": [320, 1, "i16", 10, SENTINELS_TEMPERATURE, None, POLL_TIER_NORMAL],
+    "masterlowestsupply": [321, 1, "i16", 10, SENTINELS_TEMPERATURE, None, POLL_TIER_NORMAL],
+    "coolinglocked": [322, 1, "bool", None, {}, None, POLL_TIER_FAST],
+}
+
+#location strings of the fan master (20 characters per device), read only if not cached
+#attributes: modbusadress, count, datatype, divider, sentinels, max, tier
+FANMASTER_LOCATION_TYPES = {
+    f"location_{i}": [20 + (i - 1) * 10, 10, "string", None, SENTINELS_LOCATION, None, POLL_TIER_STATIC]
+    for i in range(1, MAX_DEVICES + 1)
+}
+
+#register layout of a fan device, used to plan the block reads
+#datatypes: u16, i16, u32, bool, version (u32 major.minor.patch), enum (value only taken from sentinels)
+#divider: decoded value is divided by it (None = raw value)
+#sentinels: raw values that get a status code instead of a value (enum: labels of the raw values)
+#max: raw values above get STATUS_ERROR
+#tier: poll tier, the register is only read when the interval of its tier has expired
+#attributes: modbusadress, count, datatype, divider, sentinels, max, tier
+FANDEVICE_REGISTER_TYPES = {
+    "appl_sw_version": [0, 2, "version", None, {}, None, POLL_TIER_STATIC],
+    "dtcactive": [2, 1, "bool", None, {}, None, POLL_TIER_FAST],
+    "commtimeout": [3, 1, "bool", None, {}, None, POLL_TIER_FAST],
+    "sleep": [4, 1, "bool", None, {}, None, POLL_TIER_FAST],
+    "rssilast": [5, 1, "i16", None, {}, None, POLL_TIER_SLOW],
+    "rssifiltered": [6, 1, "i16", None, {}, None, POLL_TIER_SLOW],
+    "lqilast": [7, 1, "u16", None, {}, None, POLL_TIER_SLOW],
+    "opmode": [20, 1, "i16", None, {}, None, POLL_TIER_FAST],
+    "boostlevel": [21, 1, "u16", None, SENTINELS_BOOST, 100, POLL_TIER_FAST],
+    "debug": [22, 1, "bool", None, {}, None, POLL_TIER_FAST],
+    "tempsupply": [30, 1, "i16", 10, SENTINELS_TEMPERATURE, None, POLL_TIER_NORMAL],
+    "tempsupplyraw": [31, 1, "i16", 10, SENTINELS_TEMPERATURE, None, POLL_TIER_NORMAL],
+    "tempreturn": [32, 1, "i16", 10, SENTINELS_TEMPERATURE, None, POLL_TIER_NORMAL],
+    "temproom": [33, 1, "i16", 10, SENTINELS_TEMPERATURE, None, POLL_TIER_NORMAL],
+    "humidity": [34, 1, "u16", 10, {}, 65532, POLL_TIER_SLOW],
+    "dewpoint": [35, 1, "i16", 10, SENTINELS_DEWPOINT, None, POLL_TIER_NORMAL],
+    "fan1rpm": [36, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan2rpm": [37, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan3rpm": [38, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan4rpm": [39, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan5rpm": [40, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan6rpm": [41, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan7rpm": [42, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan8rpm": [43, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan9rpm": [44, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan10rpm": [45, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fan11rpm": [46, 1, "u16", None, SENTINELS_RPM, None, POLL_TIER_NORMAL],
+    "fanspeed": [47, 1, "u16", None, SENTINELS_SPEED, None, POLL_TIER_FAST],
+    "activemode": [48, 1, "enum", None, ENUM_ACTIVE_MODE, 3, POLL_TIER_FAST],
+    "window": [49, 1, "bool", None, {}, None, POLL_TIER_FAST],
+}
@@ -0,0 +1,66 @@
+from .const import FIELD_DEADBANDS, DEADBAND_MAX_SILENCE
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class DeadbandFilter:
+    """Holds back small changes of noisy fields so the entities are not written every cycle.
+
+    A field is identified by (address, key) like the listeners of the hub. A
+    change is published if it exceeds the deadband of the field, if the value
+    gets invalid or valid again, or if the field was last published more than
+    the max silence interval ago. Fields without deadband are always published.
+    """
+
+    def __init__(self, deadbands=FIELD_DEADBANDS, max_silence=DEADBAND_MAX_SILENCE):
+        """Initialize the filter."""
+        self._deadbands = deadbands
+        self._max_silence = max_silence
+        #(address, key) -> (published value, time of publishing)
+        self._published = {}
+        #fields with a held back change
+        self._held = set()
+
+    def exceeds(self, key, value, published):
+        """return True if the change from the published value is larger than the deadband of the key"""
+        if not (_is_number(value) and _is_number(published)):
+            return value != published
+        absolute, relative = self._deadbands[key]
+        #rounded, so a change of one resolution step is not taken as larger due to the float representation
+        change = round(abs(value - published), 6)
+        return change > absolute and change > relative * abs(published)
+
+    def filter(self, changed, get_value, now):
+        """return the changed fields to publish, get_value(address, key) returns the current value, now [s]"""
+        publish = set()
+        for field in changed | self._held:
+            if field[1] not in self._deadbands:
+                publish.add(field)
+                continue
+
+            value = get_value(*field)
+            if value is None:
+                #invalid, e.g. a timed out or removed device, the next valid value is published without a deadband
+                publish.add(field)
+                self._published.pop(field, None)
+                self._held.discard(field)
+                continue
+            published = self._published.get(field)
+            if (published is None or self.exceeds(field[1], value, published[0])
+                    or (value != published[0] and now - published[1] >= self._max_silence)):
+                publish.add(field)
+                self._published[field] = (value, now)
+                self._held.discard(field)
+            elif value != published[0]:
+                self._held.add(field)
+            else:
+                #back to the published value
+                self._held.discard(field)
+        return publish
+
+    def forget(self, address):
+        """drop the published values and held changes of a device, e.g. when it is removed from the coding list"""
+        self._published = {field: published for field, published in self._published.items() if field[0] != address}
+        self._held = {field for field in self._held if field[0] != address}
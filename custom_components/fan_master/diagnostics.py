@@ -0,0 +1,79 @@
+"""Diagnostics of the Fan Master Modbus Integration."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_NAME, CONF_HOST
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import DeviceEntry
+
+from .const import DOMAIN
+
+TO_REDACT = {CONF_HOST, "unique_id"}
+
+
+def _raw_blocks(raw_blocks):
+    return {
+        str(start_address): {"read": timestamp.isoformat(), "registers": list(registers)}
+        for start_address, (timestamp, registers) in sorted(raw_blocks.items())
+    }
+
+
+def _block_errors(block_errors):
+    return {
+        str(start_address): {"registers": list(block_error["registers"]), "errors": block_error["errors"]}
+        for start_address, block_error in sorted(block_errors.items())
+    }
+
+
+def _fan_device_diagnostics(hub, slave):
+    """return the diagnostics of a fan device"""
+    return {
+        "available": slave.available,
+        "latency_histogram": hub.metrics.histograms().get(slave.address),
+        #fields without a valid value show their status text, None if the device timed out
+        "data": dict(slave.data),
+        "raw_blocks": _raw_blocks(slave.raw_blocks),
+        "block_errors": _block_errors(slave.block_errors),
+        "poll_plan": slave.poll_plan(),
+    }
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return the diagnostics of a hub and all its fan devices."""
+    hub = hass.data[DOMAIN][entry.data[CONF_NAME]]["hub"]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "master": {
+            "available": hub.available,
+            "data": hub.data,
+            "raw_blocks": _raw_blocks(hub.raw_blocks),
+            "block_errors": _block_errors(hub.block_errors),
+            "poll_plan": hub.poll_plan(),
+        },
+        "slaves": {str(slave.address): _fan_device_diagnostics(hub, slave) for slave in hub.slaves},
+        "metrics": {
+            "last_cycle": hub.metrics.data,
+            "summary": hub.metrics.summary(),
+            "slave_latencies": {str(address): latency for address, latency in hub.metrics.slave_latencies.items()},
+            "latency_histograms": {str(unit): histogram for unit, histogram in hub.metrics.histograms().items()},
+        },
+        "connection": {
+            "state": hub.connection.state,
+            **hub.connection.attributes,
+            "history": [
+                {"time": timestamp.isoformat(), "state": state, "error": error}
+                for timestamp, state, error in hub.connection.history
+            ],
+        },
+    }
+
+
+async def async_get_device_diagnostics(hass: HomeAssistant, entry: ConfigEntry, device: DeviceEntry) -> dict:
+    """Return the diagnostics of the hub or of a single fan device."""
+    hub = hass.data[DOMAIN][entry.data[CONF_NAME]]["hub"]
+    for identifier in device.identifiers:
+        if identifier[0] == DOMAIN and len(identifier) == 3:
+            #fan devices are identified by (DOMAIN, hub name, "fan_slave_<address>")
+            slave = hub.get_device(int(identifier[2].rsplit("_", 1)[1]))
+            if slave is not None:
+                return _fan_device_diagnostics(hub, slave)
+    return await async_get_config_entry_diagnostics(hass, entry)
@@ -1,315 +1,228 @@
 import logging
+from datetime import datetime
 
-from pymodbus.constants import Endian
+import pymodbus
+
+from homeassistant.core import callback
+
+from .const import (
+    DEFAULT_MODBUS_TIMEOUT, FANDEVICE_REGISTER_TYPES, FANDEVICE_HEARTBEAT_KEYS, SLEEP_HEARTBEAT_INTERVAL,
+    HISTORY_KEYS
+)
+from .registermap import plan_register_blocks, plan_tier_blocks, decode_register_blocks, describe_poll_plan
+from .store import FieldLayout, FieldStore
+from .history import FanDeviceHistory
 
 _LOGGER = logging.getLogger(__name__)
 
+#status registers polled while a fan device sleeps or has a communication timeout
+FANDEVICE_HEARTBEAT_BLOCKS = plan_register_blocks(FANDEVICE_REGISTER_TYPES, FANDEVICE_HEARTBEAT_KEYS)
+#field order of the data records of all fan devices
+FANDEVICE_LAYOUT = FieldLayout(FANDEVICE_REGISTER_TYPES)
+
 class FanDevice:
     def __init__(self, fanmaster, slave_address):
         """Initialize the FanDevice"""
         self._name = f"slave_{slave_address}"
         self._fanmaster = fanmaster
         self._address = slave_address
-        self._sensors = []
-        self.data = {}  
-
-    def read_modbus_data_device(self):
-        return (
-            self.read_modbus_data_sw_Version()
-            and self.read_modbus_data_dtc_active()
-            and self.read_modbus_data_communication_timeout()
-            and self.read_modbus_data_sleep()
-            and self.read_modbus_data_rssi_last()
-            and self.read_modbus_data_rssi_filtered()
-            and self.read_modbus_data_lqi()
-            and self.read_modbus_data_operating_mode()
-            and self.read_modbus_data_boost_level()
-            and self.read_modbus_data_debug_mode()
-            and self.read_modbus_data_temperature_supply()
-            and self.read_modbus_data_temperature_supply_raw()
-            and self.read_modbus_data_temperature_return()
-            and self.read_modbus_data_temperature_room()
-            and self.read_modbus_data_humidity()
-            and self.read_modbus_data_dewpoint()
-            and self.read_modbus_data_fan_rpm(36,1)
-            and self.read_modbus_data_fan_rpm(37,2)
-            and self.read_modbus_data_fan_rpm(38,3)
-            and self.read_modbus_data_fan_rpm(39,4)
-            and self.read_modbus_data_fan_rpm(40,5)
-            and self.read_modbus_data_fan_rpm(41,6)
-            and self.read_modbus_data_fan_rpm(42,7)
-            and self.read_modbus_data_fan_rpm(43,8)
-            and self.read_modbus_data_fan_rpm(44,9)
-            and self.read_modbus_data_fan_rpm(45,10)
-            and self.read_modbus_data_fan_rpm(46,11)
-            and self.read_modbus_data_fan_speed()
-            and self.read_modbus_data_active_mode()
-            and self.read_modbus_data_window()
-        )
-        
-    def read_modbus_data_sw_Version(self, start_address=0):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=2)      
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        
-        value = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT32)
-        
-        appl_sw_version_major = value >> 24
-        appl_sw_version_minor = (value >> 16) & 0xFF
-        appl_sw_version_patch = (value >> 8) & 0xFF
-        not_used = value & 0xFF
-
-        #_LOGGER.debug(f'read sw_Version of {self._name} : {appl_sw_version_major}.{appl_sw_version_minor}.{appl_sw_version_patch}')
-        self.data["appl_sw_version"] = f"{appl_sw_version_major}.{appl_sw_version_minor}.{appl_sw_version_patch}"
-        
-        return True
-        
-    
-    def read_modbus_data_dtc_active(self, start_address=2):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        
-        value = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        dtc_active = (value != 0)
-        
-        #_LOGGER.debug(f'read dtc status of {self._name} : {dtc_active}')
-        self.data["dtcactive"] = dtc_active
-        
-        return True  
-    
-    def read_modbus_data_communication_timeout(self, start_address=3):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        
-        value = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        commtimeout = (value != 0)
-                
-        #_LOGGER.debug(f'read dtc status of {self._name} : {dtc_active}')
-        self.data["commtimeout"] = commtimeout
-        
-        return True 
-    
-    def read_modbus_data_sleep(self, start_address=4):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        
-        value = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        sleep = (value != 0)
-        
-        #_LOGGER.debug(f'read dtc status of {self._name} : {dtc_active}')
-        self.data["sleep"] = sleep
-        
-        return True  
-        
-    
-    def read_modbus_data_rssi_last(self, start_address=5):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        
-        self.data["rssilast"] = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.INT16)
-        
-        return True  
-    
-    def read_modbus_data_rssi_filtered(self, start_address=6):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        
-        self.data["rssifiltered"] = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.INT16)
-        
-        return True  
-    
-    def read_modbus_data_lqi(self, start_address=7):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        
-        self.data["lqilast"] = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        
-        return True 
-    
-    def read_modbus_data_operating_mode(self, start_address=20):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        
-        self.data["opmode"] = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.INT16)
-            
-        return True
-    
-    def read_modbus_data_boost_level(self, start_address=21):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False        
-        boostlevel = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        if (boostlevel == 0):
-            self.data["boostlevel"] = "Default"
-        elif (boostlevel  > 100):
-            self.data["boostlevel"] = "Error"
-        else:
-            self.data["boostlevel"] = boostlevel
-        
-        return True 
-    
-    
-    def read_modbus_data_debug_mode(self, start_address=22):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False        
-        value = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        debug = (value != 0)        
-        self.data["debug"] = debug
-        
-        return True  
-    
-    def read_modbus_data_temperature_supply(self, start_address=30):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        temperature_raw = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.INT16)
-        if (temperature_raw == 32767):
-            self.data["tempsupply"] = "Error"
-        else:
-            self.data["tempsupply"] = temperature_raw/10
-        
-        return True 
-    
-    def read_modbus_data_temperature_supply_raw(self, start_address=31):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        temperature_raw = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.INT16)
-        if (temperature_raw == 32767):
-            self.data["tempsupplyraw"] = "Error"
-        else:
-            self.data["tempsupplyraw"] = temperature_raw/10
-        
-        return True 
-    
-    def read_modbus_data_temperature_return(self, start_address=32):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        temperature_raw = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.INT16)
-        if (temperature_raw == 32767):
-            self.data["tempreturn"] = "Error"
-        else:
-            self.data["tempreturn"] = temperature_raw/10
-        
-        return True  
-    
-    def read_modbus_data_temperature_room(self, start_address=33):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+        #set once the device is removed from the coding list, entities may still hold it
+        self.removed = False
+        #set when data of the device was read or invalidated, the hub only looks for changes of refreshed devices
+        self.refreshed = False
+        self.data = FieldStore(FANDEVICE_LAYOUT)
+        self._tier_timestamps = {}
+        self._heartbeat_timestamp = None
+        #set when the device did not respond, it is only polled with the heartbeat until it responds again
+        self._unresponsive = False
+        self._last_data_received_timestamp = datetime(year=2000, month=1, day=1)
+        self.history = FanDeviceHistory()
+        #history fields read in the current cycle
+        self._history_keys = []
+        #failed reads per block start address with the registers of the failed blocks
+        self.block_errors = {}
+        #last read registers per block start address as (cycle timestamp, registers), for the diagnostics
+        self.raw_blocks = {}
+
+    @property
+    def address(self):
+        """Return the unit address of the device."""
+        return self._address
+
+    @property
+    def available(self):
+        """Return True if data of the device was received within the modbus timeout."""
+        if self.removed:
             return False
-        temperature_raw = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.INT16)
-        if (temperature_raw == 32767):
-            self.data["temproom"] = "Error"
-        else:
-            self.data["temproom"] = temperature_raw/10
-        
-        return True 
-    
-    def read_modbus_data_humidity(self, start_address=34):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False 
-        humidity_raw = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        if (humidity_raw >= 65533):
-            self.data["humidity"] = "Error"
-        else:
-            self.data["humidity"] = humidity_raw/10
-        
-        return True  
-    
-    def read_modbus_data_dewpoint(self, start_address=35):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False 
-        temperature_raw = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.INT16)
-        if (temperature_raw == 32765 or temperature_raw == 32767):
-            self.data["dewpoint"] = "Error"
-        else:
-            self.data["dewpoint"] = temperature_raw/10
-        
-        return True
-    
-    def read_modbus_data_fan_rpm(self, start_address=36, fan=1):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False        
-        speed = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        if (speed == 65534):
-            self.data[f"fan{fan}rpm"] = "NotAttached"
-        elif (speed == 65535):
-            self.data[f"fan{fan}rpm"] = "Error"
-        else:
-            self.data[f"fan{fan}rpm"] = speed
-        
-        return True
-    
-    def read_modbus_data_fan_speed(self, start_address=47):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+        return (datetime.now() - self._last_data_received_timestamp).total_seconds() <= DEFAULT_MODBUS_TIMEOUT
+
+    @property
+    def dormant(self):
+        """Return True if the device sleeps, has a communication timeout or does not respond."""
+        return self._unresponsive or bool(self.data.get("sleep")) or bool(self.data.get("commtimeout"))
+
+    def invalidate_data(self):
+        """mark all data invalid so entities get unavailable, all tiers are read again"""
+        self.data.invalidate()
+        self._tier_timestamps = {}
+        self.refreshed = True
+
+    async def async_read_modbus_data_device(self, reads):
+        """read the register blocks of all due poll tiers
+
+        the blocks are appended to reads as (block, registers, data) and decoded by the hub
+        in one batch with the blocks of the other devices, the status registers of a dormant
+        device are decoded right away. A failed block does not stop the others, returns True
+        if all blocks were read
+        """
+        if self.dormant:
+            if not self._fanmaster.is_due(self._heartbeat_timestamp, SLEEP_HEARTBEAT_INTERVAL):
+                return True
+            self._heartbeat_timestamp = self._fanmaster.cycle_timestamp
+            heartbeat_reads = []
+            heartbeat_result = await self.async_read_modbus_data_heartbeat(heartbeat_reads)
+            decode_register_blocks(FANDEVICE_REGISTER_TYPES, heartbeat_reads)
+            if not heartbeat_result:
+                return False
+            if self.dormant:
+                return True
+            _LOGGER.debug(f'{self._name} woke up, back to full polling')
+
+        tiers = self._fanmaster.due_poll_tiers(self._tier_timestamps)
+        blocks = plan_tier_blocks(FANDEVICE_REGISTER_TYPES, tiers)
+        failed_blocks = []
+        for index, block in enumerate(blocks):
+            try:
+                if not await self.async_read_modbus_data_block(block, reads):
+                    failed_blocks.append(block)
+            except pymodbus.exceptions.ModbusIOException:
+                #every further block would cost the full timeout as well
+                self._set_unresponsive()
+                failed_blocks.extend(blocks[index:])
+                break
+        self._fanmaster.update_poll_tiers(self._tier_timestamps, tiers, FANDEVICE_REGISTER_TYPES, failed_blocks)
+        return not failed_blocks
+
+    async def async_read_modbus_data_heartbeat(self, reads):
+        """read only the status registers of a dormant device"""
+        retval = True
+        for block in FANDEVICE_HEARTBEAT_BLOCKS:
+            try:
+                if not await self.async_read_modbus_data_block(block, reads):
+                    retval = False
+            except pymodbus.exceptions.ModbusIOException:
+                self._set_unresponsive()
+                return False
+        return retval
+
+    def _set_unresponsive(self):
+        """poll the device with the heartbeat only until it responds again, it turns unavailable after the modbus timeout"""
+        if not self._unresponsive:
+            _LOGGER.debug(f'{self._name} does not respond, polled with the heartbeat only')
+        self._unresponsive = True
+        self._heartbeat_timestamp = self._fanmaster.cycle_timestamp
+
+    async def async_read_modbus_data_block(self, block, reads):
+        registers = await self._fanmaster.async_read_register_block(
+            self._address, block, self.block_errors, self.raw_blocks
+        )
+        if registers is None:
             return False
-        speed = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        if (speed == 65535):
-            self.data[f"fanspeed"] = "Error"
-            
-        self.data["fanspeed"] = speed
-        
+
+        reads.append((block, registers, self.data))
+        self._history_keys.extend(key for key in block[2] if key in HISTORY_KEYS)
+        self._last_data_received_timestamp = datetime.now()
+        self.refreshed = True
+        self._unresponsive = False
+
         return True
-    
-    def read_modbus_data_active_mode(self, start_address=48):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+
+    def poll_plan(self):
+        """return the planned block reads per poll tier and the heartbeat reads while the device is dormant"""
+        return {
+            "dormant": self.dormant,
+            "tiers": describe_poll_plan(FANDEVICE_REGISTER_TYPES, self._tier_timestamps),
+            "heartbeat": {
+                "interval": SLEEP_HEARTBEAT_INTERVAL,
+                "last_read": self._heartbeat_timestamp.isoformat() if self._heartbeat_timestamp else None,
+                "blocks": [[block[0], block[1], list(block[2])] for block in FANDEVICE_HEARTBEAT_BLOCKS],
+            },
+        }
+
+    def record_history(self, timestamp):
+        """store the history fields read in this cycle, called once the blocks are decoded"""
+        if self._history_keys:
+            self.history.record(timestamp, self.data, self._history_keys)
+            self._history_keys = []
+
+
+class FanDeviceRegistry:
+    """Fan devices of a hub by unit address.
+
+    Iterating yields the devices in address order. Adding and removing a
+    device calls the listeners with the device and True / False, entities
+    keep the device they were created for instead of looking it up.
+    """
+
+    def __init__(self):
+        """Initialize the registry."""
+        self._devices = {}
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __iter__(self):
+        return iter(list(self._devices.values()))
+
+    def __contains__(self, address):
+        return address in self._devices
+
+    def get(self, address):
+        """return the device of the address, None if it is not in the registry"""
+        return self._devices.get(address)
+
+    def addresses(self):
+        return set(self._devices)
+
+    @callback
+    def async_add(self, device):
+        """add a device, returns False if the address is already taken"""
+        if device.address in self._devices:
             return False
-        mode = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        modeString = ""
-        if (mode == 0): modeString  = "Off"
-        elif (mode == 1): modeString  = "Boost"
-        elif (mode == 2): modeString  = "Heating"
-        elif (mode == 3): modeString  = "Cooling"
-        else: modeString = "Error"
-        self.data["activemode"] = modeString
-        
+        #keep the poll order by address
+        in_order = not self._devices or device.address > next(reversed(self._devices))
+        self._devices[device.address] = device
+        if not in_order:
+            self._devices = dict(sorted(self._devices.items()))
+        self._async_notify(device, True)
         return True
-    
-    def read_modbus_data_window(self, start_address=49):
-        data_package = self._fanmaster.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False        
-        
-        value = self._fanmaster._client.convert_from_registers(data_package.registers, self._fanmaster._client.DATATYPE.UINT16)
-        window = (value != 0)
-        self.data["window"] = window
-        
-        return True
-    
-    
-    
-    
\ No newline at end of file
+
+    @callback
+    def async_remove(self, address):
+        """remove the device of the address, returns the removed device or None"""
+        device = self._devices.pop(address, None)
+        if device is not None:
+            device.removed = True
+            self._async_notify(device, False)
+        return device
+
+    @callback
+    def async_listen(self, listener):
+        """call listener(device, added) on every change, the known devices are reported right away
+
+        returns a function to stop listening
+        """
+        self._listeners.append(listener)
+        for device in self:
+            listener(device, True)
+
+        @callback
+        def remove_listener():
+            self._listeners.remove(listener)
+        return remove_listener
+
+    @callback
+    def _async_notify(self, device, added):
+        for listener in list(self._listeners):
+            listener(device, added)
@@ -1,153 +1,339 @@
+import asyncio
 import logging
-import threading
+import time
 from typing import Optional
 from datetime import timedelta, datetime
 
 import pymodbus
-from pymodbus.client import ModbusTcpClient
 
 from homeassistant.core import callback
-from homeassistant.helpers.event import async_track_time_interval
 from .const import (
-    MAX_DEVICES, DEFAULT_MODBUS_TIMEOUT
+    MAX_DEVICES, DEFAULT_MODBUS_TIMEOUT, LOCATION_REFRESH_INTERVAL, DEFAULT_TRANSPORT, TRANSPORT_ASYNC,
+    TRANSPORT_PIPELINED, DEFAULT_PIPELINE_WINDOW, DEFAULT_MAX_SCAN_INTERVAL, REQUEST_TIMEOUT, LIVENESS_PROBE_KEY,
+    CONNECTION_STATE_CONNECTED, POLL_TIER_INTERVALS, POLL_TIER_RETRY_INTERVAL,
+    FANMASTER_REGISTER_TYPES, FANMASTER_LOCATION_TYPES, FANDEVICE_REGISTER_TYPES, STATUS_OK, STATUS_NOT_READ
+)
+from .fandevice import FanDevice, FanDeviceRegistry, FANDEVICE_LAYOUT
+from .transport import FanMasterSyncTransport, FanMasterAsyncTransport, FanMasterPipelinedTransport
+from .writequeue import FanMasterWriteQueue
+from .metrics import FanMasterMetrics, response_size
+from .scheduler import FanMasterPollScheduler
+from .deadband import DeadbandFilter
+from .connection import FanMasterConnection
+from .topology import FanMasterTopology, INVALID_LOCATIONS, topology_addresses
+from .registermap import (
+    plan_register_blocks, plan_tier_blocks, due_poll_tiers, decode_register_blocks, describe_poll_plan
 )
-from .fandevice import FanDevice
 
 _LOGGER = logging.getLogger(__name__)
 
-def bitfield(value, size=None):
-    """convert a int to a bitfield represented in a list"""    
-    if size is not None:
-            return [int(digit) for digit in bin(value)[2:].zfill(size)] # [2:] to chop off the "0b" part 
-    else:
-            return [int(digit) for digit in bin(value)[2:]]             # [2:] to chop off the "0b" part 
+#master keys of the locations, published on the topic of the fan device as LOCATION_KEY
+LOCATION_ADDRESSES = {f"location_{address}": address for address in range(1, MAX_DEVICES+1)}
+LOCATION_KEY = "location"
 
 class FanMaster:
-    """Thread safe wrapper class for pymodbus."""
+    """Fan Master modbus hub."""
 
-    def __init__(self, hass, name, host, port, address, scan_interval, numberDevices=1):
+    def __init__(self, hass, name, host, port, address, scan_interval, numberDevices=0, transport=DEFAULT_TRANSPORT,
+                 pipeline_window=DEFAULT_PIPELINE_WINDOW, max_scan_interval=DEFAULT_MAX_SCAN_INTERVAL, coordinator=None):
         """Initialize the Modbus hub."""
         self._hass = hass
-        self._client = ModbusTcpClient(host=host, port=port, timeout=max(3, (scan_interval - 1)))
-        self._lock = threading.Lock()
+        if (transport == TRANSPORT_PIPELINED):
+            self._transport = FanMasterPipelinedTransport(hass, host, port, REQUEST_TIMEOUT, pipeline_window)
+        elif (transport == TRANSPORT_ASYNC):
+            self._transport = FanMasterAsyncTransport(hass, host, port, REQUEST_TIMEOUT)
+        else:
+            self._transport = FanMasterSyncTransport(hass, host, port, REQUEST_TIMEOUT)
+        self.metrics = FanMasterMetrics(address)
+        self.connection = FanMasterConnection(
+            hass, self._transport, self.metrics, self.async_probe, self._async_connection_state_changed
+        )
+        self._write_queue = FanMasterWriteQueue(self._transport, self.metrics, self.connection)
         self._name = name
         self._address = address
-        self._scan_interval = timedelta(seconds=scan_interval)        
+        self._scheduler = FanMasterPollScheduler(
+            hass, name, self.async_refresh_modbus_data, self.metrics, scan_interval, max_scan_interval, coordinator
+        )
         self._last_data_received_timestamp = datetime(year=2000, month=1, day=1)
-        self._unsub_interval_method = None
-        self._sensors = []
-        self.slaves = []
+        #update callback -> (address, keys) it listens to
+        self._sensors = {}
+        #one topic per device, address -> key -> update callbacks, None is the master
+        self._topics = {}
+        #fan devices by unit address
+        self.slaves = FanDeviceRegistry()
         self.data = {}
+        #decoded master registers, kept across the poll tiers
+        self._master_values = {}
+        self._location_timestamps = {}
+        self._location_refresh_interval = timedelta(seconds=LOCATION_REFRESH_INTERVAL)
+        self._tier_timestamps = {}
+        self._cycle_timestamp = datetime.now()
+        #failed reads per block start address with the registers of the failed blocks
+        self.block_errors = {}
+        #last read registers per block start address as (cycle timestamp, registers), for the diagnostics
+        self.raw_blocks = {}
+        #small changes of noisy fields are not published every cycle
+        self.deadband = DeadbandFilter()
+        #cache of the coding list, locations and firmware versions, only with a config entry
+        self._topology = None
+        self._topology_data = {}
         
         self.addDevices(numberDevices)        
     
     def addDevices(self, numberDevices):
-        #Temp solution: create 2 Devices only
+        """add the devices 1..numberDevices before the coding list is known"""
         for i in range(1, numberDevices+1):
-            self.slaves.append(FanDevice(self, i))
+            self.addDevice(i)
             
     def addDevice(self, address):
-        self.slaves.append(FanDevice(self, address))
-        return True
+        return self.slaves.async_add(FanDevice(self, address))
         
     def removeDevice(self, address):
-        self.slaves.remove(self.get_device(address))
+        return self.slaves.async_remove(address) is not None
+
+    async def async_load_topology(self):
+        """add the fan devices of the cached topology so their entities are created right away
+
+        the cached locations and firmware versions are shown until the first cycles read them again
+        """
+        self._topology = FanMasterTopology(self._hass, self._name)
+        data = await self._topology.async_load()
+        if data is None:
+            return False
+        self._topology_data = data
+
+        addresses = topology_addresses(data)
+        _LOGGER.debug(f'cached topology, coded fan devices: {addresses}')
+        for address in addresses:
+            if not self.is_known_device(address):
+                self.addDevice(address)
+        for address, location in data.get("locations", {}).items():
+            self.data[f"location_{address}"] = location
+        self.data.update(data.get("firmware", {}).get("master", {}))
+        for address, version in data.get("firmware", {}).get("slaves", {}).items():
+            slave = self.get_device(int(address))
+            if slave is not None:
+                slave.data["appl_sw_version"] = version
         return True
+
+    def topology_snapshot(self):
+        """return the current topology in the form of the cache"""
+        cached_firmware = self._topology_data.get("firmware", {}).get("slaves", {})
+        locations = {}
+        slave_firmware = {}
+        for slave in self.slaves:
+            address = str(slave.address)
+            location = self.data.get(f"location_{slave.address}")
+            if location not in INVALID_LOCATIONS:
+                locations[address] = location
+            if slave.data.status("appl_sw_version") == STATUS_OK:
+                slave_firmware[address] = slave.data["appl_sw_version"]
+            elif address in cached_firmware:
+                #a sleeping device keeps its last known version
+                slave_firmware[address] = cached_firmware[address]
+        return {
+            "coding_list": [slave.address for slave in self.slaves],
+            "locations": locations,
+            "firmware": {
+                "master": {
+                    key: self.data[key] for key in ("fbl_sw_version", "appl_sw_version") if self.data.get(key) is not None
+                },
+                "slaves": slave_firmware,
+            },
+        }
+
+    @callback
+    def _async_update_topology(self):
+        """write the topology to the cache once the coding list was read"""
+        if self._topology is None or not self.available or self.data.get("codingInvalid") is not False:
+            return
+        self._topology_data = self.topology_snapshot()
+        self._topology.async_update(self._topology_data)
+
+    @callback
+    def async_add_device_listener(self, device_callback):
+        """call device_callback(device, added) whenever a fan device is added or removed
+
+        the known devices are reported right away, returns a function to stop listening
+        """
+        return self.slaves.async_listen(device_callback)
+
+    def field_value(self, address, key):
+        """return the current value of a field of the master (address None) or of a fan device"""
+        if address is None:
+            return self.data.get(key)
+        return self.device_data(address).get(key)
+
+    def device_data(self, address):
+        """return the data of a fan device, empty if the device is not in the device list"""
+        slave = self.get_device(address)
+        return slave.data if slave is not None else {}
         
     def get_device(self, address):
-        for slave in self.slaves:
-            if (slave._address == address):
-                return slave
-        return None
+        return self.slaves.get(address)
             
     def is_known_device(self, address):
-        for slave in self.slaves:
-            if (slave._address == address):
-                return True
-        return False
+        return address in self.slaves
             
     def updateDeviceList(self):
-        """Update the devices."""
+        """Update the devices, only the differences to the coding list are applied."""
         
-        _LOGGER.debug("Updating Devices ...")
-        if self.slaves is None:
-            self.slaves = []
-            
         codingList = self.data["mastercodinglist"]
         codingInvalid = self.data["codingInvalid"]
-        index = 0
         if (not codingInvalid):
-            for codingBit in codingList:
-                index  = index + 1
-                if (codingBit):
-                    if (not self.is_known_device(index)):
-                        _LOGGER.info(f"add address {index} to device list as its newly coded")
-                        self.addDevice(index)
-                else:
-                    if (self.is_known_device(index)):
-                        _LOGGER.info(f"remove address {index} from device list as its not part of coding anymore")
-                        self.removeDevice(index)
+            coded = {index for index, codingBit in enumerate(codingList, 1) if codingBit}
+            known = self.slaves.addresses()
+            for index in sorted(coded - known):
+                _LOGGER.info(f"add address {index} to device list as its newly coded")
+                self.addDevice(index)
+            for index in sorted(known - coded):
+                _LOGGER.info(f"remove address {index} from device list as its not part of coding anymore")
+                self.removeDevice(index)
         return True    
             
     @callback
-    def async_add_fanmaster_sensor(self, update_callback):
-        """Listen for data updates."""
-        # This is the first sensor, set up interval.
+    def async_add_fanmaster_sensor(self, update_callback, address=None, keys=()):
+        """Listen for updates of the data keys of the master (address None) or of a fan device.
+
+        the callback joins the topic of its device only, it is called when one of the keys changed
+        """
+        # This is the first sensor, start the poll cycles.
         if not self._sensors:
-           # self.connect()
-            self._unsub_interval_method = async_track_time_interval(
-                self._hass, self.async_refresh_modbus_data, self._scan_interval
-            )
+            self._scheduler.async_start()
 
-        self._sensors.append(update_callback)
+        keys = list(keys)
+        if address is not None:
+            #the names of the fan device entities contain the location
+            keys.append(LOCATION_KEY)
+        topic = self._topics.setdefault(address, {})
+        for key in keys:
+            topic.setdefault(key, []).append(update_callback)
+        self._sensors[update_callback] = (address, keys)
 
     @callback
     def async_remove_fanmaster_sensor(self, update_callback):
         """Remove data update."""
-        self._sensors.remove(update_callback)
+        if update_callback not in self._sensors:
+            return
+        address, keys = self._sensors.pop(update_callback)
+        topic = self._topics[address]
+        for key in keys:
+            topic[key].remove(update_callback)
+            if not topic[key]:
+                del topic[key]
+        if not topic:
+            del self._topics[address]
 
         if not self._sensors:
-            """stop the interval timer upon removal of last sensor"""
-            self._unsub_interval_method()
-            self._unsub_interval_method = None
-            self.close()
+            """stop the poll cycles upon removal of last sensor"""
+            self._scheduler.async_stop()
+            self._hass.async_create_task(self.async_close())
+
+    def _snapshot_data(self):
+        """copy the data of the master and of all fan devices to detect changes"""
+        snapshot = {None: dict(self.data)}
+        for slave in self.slaves:
+            snapshot[slave.address] = slave.data.snapshot()
+        return snapshot
+
+    def _changed_keys(self, snapshot):
+        """return the (address, key) pairs whose value differs from the snapshot"""
+        changed = set()
+        old_data = snapshot[None]
+        for key in old_data.keys() | self.data.keys():
+            if old_data.get(key) != self.data.get(key):
+                changed.add((None, key))
+
+        for slave in self.slaves:
+            if slave.address not in snapshot:
+                keys = list(slave.data)
+            elif slave.refreshed:
+                keys = slave.data.changed_keys(snapshot[slave.address])
+            else:
+                #not read in this cycle, e.g. a sleeping device between its heartbeats
+                continue
+            slave.refreshed = False
+            changed.update((slave.address, key) for key in keys)
+
+        #the entities of removed fan devices get unavailable
+        for address in snapshot.keys() - {None} - {slave.address for slave in self.slaves}:
+            changed.update(
+                (address, key) for key, status in zip(FANDEVICE_LAYOUT.keys, snapshot[address][1])
+                if status != STATUS_NOT_READ
+            )
+        return changed
+
+    @callback
+    def _async_notify_changed(self, changed):
+        """publish the changed (address, key) pairs on the topics of their devices"""
+        topic_keys = {}
+        for address, key in changed:
+            topic_keys.setdefault(address, set()).add(key)
+            if address is None and key in LOCATION_ADDRESSES:
+                topic_keys.setdefault(LOCATION_ADDRESSES[key], set()).add(LOCATION_KEY)
+        for address, keys in topic_keys.items():
+            self._async_publish(address, keys)
+
+    @callback
+    def _async_publish(self, address, keys):
+        """call the entities of the device that depend on a changed key, every entity at most once"""
+        topic = self._topics.get(address)
+        if not topic:
+            return
+        update_callbacks = dict.fromkeys(
+            update_callback for key in keys for update_callback in topic.get(key, ())
+        )
+        if update_callbacks:
+            _LOGGER.debug(f'{len(keys)} values of {address or "master"} changed, updating {len(update_callbacks)} entities')
+        for update_callback in update_callbacks:
+            update_callback()
                 
     async def async_refresh_modbus_data(self, _now: Optional[int] = None) -> dict:
         """Time to update."""
-        result : bool = await self._hass.async_add_executor_job(self._refresh_modbus_data)
-        if result:
-            self._last_data_received_timestamp = datetime.now()
-            
-        
-        if (datetime.now() - self._last_data_received_timestamp).total_seconds() > DEFAULT_MODBUS_TIMEOUT:
-            #set all data to None so entities get unavailable
-            
-            self.data = dict.fromkeys(self.data, None)
-            
-            for slave in self.slaves:
-                slave.data = dict.fromkeys(slave.data, None)
-            
-            #for date in self.data:
-            #    date = None
-            #for slave in self.slaves:
-            #    for date in slave.data:
-            #        date = None
+        snapshot = self._snapshot_data()
+        metrics_snapshot = dict(self.metrics.data)
+        cycle_start = time.monotonic()
+        await self._async_refresh_modbus_data()
+        self.metrics.finish_cycle(time.monotonic() - cycle_start, self.poll_interval)
+
+        #the master and every fan device time out on their own
+        if not self.available:
+            self.invalidate_data()
+        for slave in self.slaves:
+            if not slave.available:
+                slave.invalidate_data()
                     
-        for update_callback in self._sensors:
-            update_callback()
+        changed = self.deadband.filter(self._changed_keys(snapshot), self.field_value, time.monotonic())
+        changed.update(
+            (None, key) for key, value in self.metrics.data.items() if metrics_snapshot.get(key) != value
+        )
+        self._async_notify_changed(changed)
+        self._async_update_topology()
+
+    @property
+    def available(self):
+        """Return True if master data was received within the modbus timeout."""
+        return (datetime.now() - self._last_data_received_timestamp).total_seconds() <= DEFAULT_MODBUS_TIMEOUT
 
+    def invalidate_data(self):
+        """set all master data to None so entities get unavailable, caches are read again"""
+        self.data = dict.fromkeys(self.data, None)
+        self._master_values = {}
+        self._location_timestamps = {}
+        self._tier_timestamps = {}
 
-    def _refresh_modbus_data(self, _now: Optional[int] = None) -> bool:
+
+    async def _async_refresh_modbus_data(self, _now: Optional[int] = None) -> bool:
         """Time to update."""
         if not self._sensors:
             return False
 
-        if not self._check_and_reconnect():
-            #if not connected, skip
+        if not await self.connection.async_ensure_connected():
+            #not connected, waiting for the next reconnect
             return False
 
         try:
-            update_result = self.read_modbus_data()
+            update_result = await self.async_read_modbus_data()
         except Exception as e:
             _LOGGER.exception("Error reading modbus data", exc_info=True)
             update_result = False
@@ -160,97 +346,261 @@ class FanMaster:
         """Return the name of this hub."""
         return self._name
 
-    def close(self):
+    async def async_close(self):
         """Disconnect client."""
-        with self._lock:
-            self._client.close()
-
-    def _check_and_reconnect(self):
-        if not self._client.connected:
-            _LOGGER.info("modbus client is not connected, trying to reconnect")
-            return self.connect()
-        return self._client.connected
+        await self._transport.async_close()
 
-    def connect(self):
+    async def async_connect(self):
         """Connect client."""
-        result = False
-        with self._lock:
-            result = self._client.connect()
+        result = await self._transport.async_connect()
 
         if result:
             _LOGGER.info("successfully connected to %s:%s",
-                         self._client.comm_params.host, self._client.comm_params.port)
+                         self._transport.host, self._transport.port)
         else:
             _LOGGER.warning("not able to connect to %s:%s",
-                            self._client.comm_params.host, self._client.comm_params.port)
+                            self._transport.host, self._transport.port)
         return result
     
 
-    def read_holding_registers(self, unit, address, count):
-        """Read holding registers."""
+    @callback
+    def _async_connection_state_changed(self):
+        self._async_notify_changed({(None, "connection_state")})
+
+    async def async_probe(self):
+        """read one register of the master, returns True if the gateway responded
+
+        the probe does not wait for the write queue, it also checks the gateway for a write without response
+        """
+        response = await self._async_read_transport(self._address, FANMASTER_REGISTER_TYPES[LIVENESS_PROBE_KEY][0], 1)
+        if response is None:
+            return False
+        self.connection.record_response()
+        return True
+
+    async def async_read_holding_registers(self, unit, address, count):
+        """Read holding registers, None if the unit did not respond."""
+        if self._write_queue.pending:
+            #writes go ahead of the pending poll reads
+            await self._write_queue.async_process()
+        response = await self._async_read_transport(unit, address, count)
+        if response is not None:
+            self.connection.record_response()
+        elif not await self.connection.async_record_timeout():
+            raise pymodbus.exceptions.ConnectionException("gateway does not respond")
+        return response
+
+    async def _async_read_transport(self, unit, address, count):
+        """read holding registers through the transport and count the transaction, None without response"""
+        start = time.monotonic()
         try:
-            with self._lock:
-                return self._client.read_holding_registers(
-                    address=address, count=count, slave=unit
-                )
-        except BrokenPipeError:
-            self.close()
-
-    def write_registers(self, unit, address, payload):
-        """Write registers."""
-        with self._lock:
-            return self._client.write_registers(
-                address=address, values=payload, slave=unit
-            )
+            response = await self._transport.async_read_holding_registers(unit, address, count)
+        except pymodbus.exceptions.ModbusIOException as e:
+            _LOGGER.debug(f'no response of unit {unit} at start address {address}: {e}')
+            response = None
+        except Exception:
+            self.metrics.record_transaction(unit, time.monotonic() - start, True, 0)
+            raise
+        self.metrics.record_transaction(
+            unit, time.monotonic() - start, response is None or response.isError(), response_size(response)
+        )
+        return response
+
+    @staticmethod
+    def _count_block_error(block_errors, block):
+        """count a failed block read per start address, with all registers the blocks from it covered"""
+        block_error = block_errors.setdefault(block[0], {"registers": [], "errors": 0})
+        block_error["registers"].extend(key for key in block[2] if key not in block_error["registers"])
+        block_error["errors"] += 1
+
+    async def async_read_register_block(self, unit, block, block_errors, raw_blocks):
+        """read a planned register block, failures are counted and the registers kept per start address
+
+        returns None on an error response, raises ModbusIOException if the unit did not respond at all
+        """
+        start_address = block[0]
+        data_package = await self.async_read_holding_registers(unit=unit, address=start_address, count=block[1])
+        if data_package is None:
+            self._count_block_error(block_errors, block)
+            raise pymodbus.exceptions.ModbusIOException(f'no response of unit {unit} at start address {start_address}')
+        if data_package.isError() or len(data_package.registers) != block[1]:
+            _LOGGER.debug(f'data Error of unit {unit} at start address {start_address}')
+            self._count_block_error(block_errors, block)
+            return None
+        raw_blocks[start_address] = (self._cycle_timestamp, data_package.registers)
+        return data_package.registers
+
+    async def async_write_registers(self, unit, address, payload):
+        """Queue a write of registers, returns True once it is applied."""
+        if self.connection.state != CONNECTION_STATE_CONNECTED:
+            _LOGGER.debug(f'not connected, write to unit {unit} address {address} dropped')
+            return False
+        future = self._write_queue.async_enqueue(unit, address, payload, multiple=True)
+        self._hass.async_create_task(self._write_queue.async_process())
+        return await future
             
-    def write_register(self, unit, address, payload):
-        """Write register."""
-        with self._lock:
-            return self._client.write_register(
-                address=address, value=payload, slave=unit
-            )
+    async def async_write_register(self, unit, address, payload):
+        """Queue a write of a register, returns True once it is applied."""
+        if self.connection.state != CONNECTION_STATE_CONNECTED:
+            _LOGGER.debug(f'not connected, write to unit {unit} address {address} dropped')
+            return False
+        future = self._write_queue.async_enqueue(unit, address, payload)
+        self._hass.async_create_task(self._write_queue.async_process())
+        return await future
             
-    def read_modbus_data(self):
+    @property
+    def poll_interval(self):
+        """Return the current poll interval [s], it follows the cycle duration."""
+        return self._scheduler.interval
+
+    @property
+    def cycle_timestamp(self):
+        """Return the start time of the current poll cycle."""
+        return self._cycle_timestamp
+
+    def is_due(self, timestamp, interval):
+        """return True if the interval since the timestamp expires in this cycle"""
+        #half a scan interval tolerance so a read is not delayed a full cycle by timer jitter
+        tolerance = self.poll_interval / 2
+        return timestamp is None or (self._cycle_timestamp - timestamp).total_seconds() + tolerance >= interval
+
+    def due_poll_tiers(self, tier_timestamps):
+        """return the poll tiers due in this cycle"""
+        #half a scan interval tolerance so a tier is not delayed a full cycle by timer jitter
+        return due_poll_tiers(tier_timestamps, self._cycle_timestamp, self.poll_interval / 2)
+
+    def update_poll_tiers(self, tier_timestamps, tiers, register_types, failed_blocks):
+        """mark the poll tiers as read in this cycle
+
+        a tier with a register in a failed block is read again after the retry interval, not every cycle,
+        so a register the firmware does not implement does not keep all tiers of its block due
+        """
+        failed_tiers = {register_types[key][6] for block in failed_blocks for key in block[2]}
+        for tier in tiers:
+            if tier in failed_tiers:
+                interval = POLL_TIER_INTERVALS[tier]
+                retry = min(interval, POLL_TIER_RETRY_INTERVAL)
+                tier_timestamps[tier] = self._cycle_timestamp - timedelta(seconds=interval - retry)
+            else:
+                tier_timestamps[tier] = self._cycle_timestamp
+
+    async def async_read_modbus_data(self):
+        """read the master and all fan devices, returns True if nothing failed"""
         _LOGGER.debug("Modbus read Start")
+        self._cycle_timestamp = datetime.now()
         result = False
         try:
-            return (
-                self.read_modbus_data_master_sw_Version()
-                and self.read_modbus_data_master_dtc_active()
-                and self.read_modbus_data_master_codingList()
-                and self.updateDeviceList()
-                and self.read_modbus_data_master_locations()
-                and self.read_modbus_data_master_worst_dewpoint()
-                and self.read_modbus_data_master_lowest_supply()
-                and self.read_modbus_data_master_cooling_locked()
-                and self.read_modbus_data_slaves()
-            )
-        except (BrokenPipeError, pymodbus.exceptions.ModbusIOException):
-            self.close()
+            #a failing block or fan device does not stop the others, partial results are kept
+            master_result = await self.async_read_modbus_data_master()
+            slaves_result = await self.async_read_modbus_data_slaves()
+            result = master_result and slaves_result
+        except (OSError, pymodbus.exceptions.ConnectionException) as e:
+            #e.g. a connection reset by the gateway, the connection manager reconnects with backoff
+            _LOGGER.debug(f'connection lost during the poll cycle: {e}')
+            await self.async_close()
 
         _LOGGER.debug("Modbus read End")
         return result
 
-    def read_modbus_data_slaves(self):
-        """start reading data"""
-        retval = True                    
-        for fandevice in self.slaves:
-            _LOGGER.debug(f'read Fan device data of {fandevice._name}')
-            retval = retval and fandevice.read_modbus_data_device()
-        
+    async def async_read_modbus_data_master(self):
+        """read and decode the master registers, every value is decoded on its own"""
+        retval = await self.async_read_modbus_data_master_registers()
+        retval = self.read_modbus_data_master_sw_Version() and retval
+        retval = self.read_modbus_data_master_dtc_active() and retval
+        retval = self.read_modbus_data_master_worst_dewpoint() and retval
+        retval = self.read_modbus_data_master_lowest_supply() and retval
+        retval = self.read_modbus_data_master_cooling_locked() and retval
+        if self.read_modbus_data_master_codingList():
+            self.updateDeviceList()
+            retval = await self.async_read_modbus_data_master_locations() and retval
+        else:
+            retval = False
         return retval
 
-    def read_modbus_data_master_sw_Version(self, start_address=0):
+    async def async_read_modbus_data_slaves(self):
         """start reading data"""
-        data_package = self.read_holding_registers(unit=self._address, address=start_address, count=4)      
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+        if self._transport.pipelined:
+            return await self.async_read_modbus_data_slaves_pipelined()
+
+        retval = True
+        reads = []
+        try:
+            for fandevice in self.slaves:
+                _LOGGER.debug(f'read Fan device data of {fandevice._name}')
+                retval = await fandevice.async_read_modbus_data_device(reads) and retval
+        finally:
+            #the blocks of all fan devices are decoded in one batch, also if the connection broke
+            self.decode_slave_reads(reads)
+
+        return retval
+
+    async def async_read_modbus_data_slaves_pipelined(self):
+        """read all fan devices at once, the transport window limits the requests in flight"""
+        reads = []
+        results = await asyncio.gather(
+            *[fandevice.async_read_modbus_data_device(reads) for fandevice in self.slaves],
+            return_exceptions=True
+        )
+        self.decode_slave_reads(reads)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return all(results)
+
+    def decode_slave_reads(self, reads):
+        """decode the blocks of all fan devices in one batch and record their history"""
+        decode_register_blocks(FANDEVICE_REGISTER_TYPES, reads)
+        timestamp = self._cycle_timestamp.timestamp()
+        for fandevice in self.slaves:
+            fandevice.record_history(timestamp)
+
+    def get_history(self, addresses, keys, start, end, resolution=None):
+        """return the history of the fan devices within the time window [epoch s]"""
+        history = {}
+        for address in addresses:
+            fandevice = self.get_device(address)
+            if fandevice is not None:
+                history[address] = fandevice.history.window(keys, start, end, resolution)
+        return history
+
+    async def async_read_modbus_data_master_registers(self):
+        """read and decode the master register blocks of all due poll tiers"""
+        tiers = self.due_poll_tiers(self._tier_timestamps)
+        failed_blocks = []
+        reads = []
+        for block in plan_tier_blocks(FANMASTER_REGISTER_TYPES, tiers):
+            try:
+                registers = await self.async_read_register_block(self._address, block, self.block_errors, self.raw_blocks)
+            except pymodbus.exceptions.ModbusIOException:
+                #a master without response is checked by the liveness probe, the other blocks are still read
+                registers = None
+            if registers is None:
+                failed_blocks.append(block)
+                continue
+            reads.append((block, registers, self._master_values))
+            self._last_data_received_timestamp = datetime.now()
+        decode_register_blocks(FANMASTER_REGISTER_TYPES, reads)
+
+        self.update_poll_tiers(self._tier_timestamps, tiers, FANMASTER_REGISTER_TYPES, failed_blocks)
+        return not failed_blocks
+
+    def poll_plan(self):
+        """return the planned block reads of the master per poll tier and the last reads of the locations"""
+        return {
+            "tiers": describe_poll_plan(FANMASTER_REGISTER_TYPES, self._tier_timestamps),
+            "locations": {key: timestamp.isoformat() for key, timestamp in sorted(self._location_timestamps.items())},
+        }
+
+    def decode_master_register(self, key):
+        """return a decoded master register, None if not read yet"""
+        return self._master_values.get(key)
+
+    def read_modbus_data_master_sw_Version(self):
+        """decode the software versions"""
+        value = self.decode_master_register("sw_version")
+        if value is None:
             return False
         
-        
-        
-        value = self._client.convert_from_registers(data_package.registers, self._client.DATATYPE.UINT64)
-        
         fbl_sw_version_major = value >> 56
         fbl_sw_version_minor = (value >> 48) & 0xFF
         fbl_sw_version_patch = (value >> 40) & 0xFF
@@ -263,36 +613,26 @@ class FanMaster:
         
         return True
     
-    def read_modbus_data_master_dtc_active(self, start_address=3):
-        """start reading data"""
-        data_package = self.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+    def read_modbus_data_master_dtc_active(self):
+        """decode the dtc status"""
+        dtc_active = self.decode_master_register("dtcactive")
+        if dtc_active is None:
             return False
         
-        value = self._client.convert_from_registers(data_package.registers, self._client.DATATYPE.UINT16)
-        
-        dtc_active = (value != 0)
-        
         self.data["dtcactive"] = dtc_active
         
         return True     
     
-    def read_modbus_data_master_codingList(self, start_address=10):
-        """start reading data"""
-        data_package = self.read_holding_registers(unit=self._address, address=start_address, count=2) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+    def read_modbus_data_master_codingList(self):
+        """decode the coding list"""
+        coding_value = self.decode_master_register("codinglist")
+        if coding_value is None:
             return False
-
-        coding_value = self._client.convert_from_registers(data_package.registers, self._client.DATATYPE.UINT32)
         _LOGGER.debug(f'coding_value: {coding_value}')
         
-        coding_list = bitfield(coding_value, 32)
-        coding_list.reverse()
-        codingValid = coding_list[31]
-        coding_list.pop() # remove element 32 (Valid bit)
-        coding_list.pop() # remove element 31 (unused bit)
+        #bit 0..29 = device 1..30, bit 30 unused, bit 31 = valid bit
+        coding_list = [(coding_value >> bit) & 1 for bit in range(MAX_DEVICES)]
+        codingValid = (coding_value >> 31) & 1
         
         _LOGGER.debug(f'coding_list: {coding_list}')
                 
@@ -301,80 +641,66 @@ class FanMaster:
         
         return True    
     
-    def read_modbus_data_master_locations(self, start_address=20, numberLocations=MAX_DEVICES, stringSize=20):
+    async def async_read_modbus_data_master_locations(self):
+        """read the location strings of newly coded devices or of expired cache entries"""
+        now = datetime.now()
+        codingList = self.data["mastercodinglist"]
+        keys = []
+        for i in range(1, MAX_DEVICES+1):
+            key = f"location_{i}"
+            if (not codingList[i-1]):
+                #forget the cached location, it is read again as soon as the device gets coded
+                self._location_timestamps.pop(key, None)
+                self.data[key] = "not coded"
+            elif (key not in self._location_timestamps
+                  or (now - self._location_timestamps[key]) > self._location_refresh_interval):
+                keys.append(key)
+
         retval = True
-        for i in range(1,numberLocations+1):
-            #parse through all locations
+        reads = []
+        for block in plan_register_blocks(FANMASTER_LOCATION_TYPES, keys):
             try:
-                if(self.data["mastercodinglist"][i-1]):
-                    address = int(start_address + ( (i - 1)  * stringSize / 2))
-                    retval = retval and self.read_modbus_data_master_location(i, address, stringSize)
-                else:
-                    self.data[f"location_{i}"] = "not coded"
-            except IndexError:
-                self.data[f"location_{i}"] = "out of mastercodinglist"
-            
+                registers = await self.async_read_register_block(self._address, block, self.block_errors, self.raw_blocks)
+            except pymodbus.exceptions.ModbusIOException:
+                #a master without response is checked by the liveness probe, the other blocks are still read
+                registers = None
+            if registers is None:
+                retval = False
+                continue
+
+            reads.append((block, registers, self.data))
+            for key in block[2]:
+                self._location_timestamps[key] = now
+        decode_register_blocks(FANMASTER_LOCATION_TYPES, reads)
+
         return retval
     
-    
-
-    def read_modbus_data_master_location(self, index, start_address=20, stringSize=20):
-        """start reading data"""
-        
-        length=int(stringSize/2)
-        data_package = self.read_holding_registers(unit=self._address, address=start_address, count=length)
-        
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+    def read_modbus_data_master_worst_dewpoint(self):
+        """decode the worst dewpoint of all devices"""
+        temperature = self.decode_master_register("masterworstdewpoint")
+        if temperature is None:
             return False
         
-        string_location = self._client.convert_from_registers(data_package.registers, self._client.DATATYPE.STRING)
+        self.data["masterworstdewpoint"] = temperature
         
-        if (string_location == ""):
-            self.data[f"location_{index}"] = "no location in Parameter"
-        else:
-            self.data[f"location_{index}"] = string_location
-            
-        #_LOGGER.debug(f'location {index} = {string_location}')     
-             
         return True
     
-    def read_modbus_data_master_worst_dewpoint(self, start_address=320):
-        data_package = self.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+    def read_modbus_data_master_lowest_supply(self):
+        """decode the lowest supply temperature of all devices"""
+        temperature = self.decode_master_register("masterlowestsupply")
+        if temperature is None:
             return False
-        temperature_raw = self._client.convert_from_registers(data_package.registers, self._client.DATATYPE.INT16)
         
-        if (temperature_raw == 32767):
-            self.data["masterworstdewpoint"] = "Error"
-        else:
-            self.data["masterworstdewpoint"] = temperature_raw/10
+        self.data["masterlowestsupply"] = temperature
         
         return True
     
-    def read_modbus_data_master_lowest_supply(self, start_address=321):
-        data_package = self.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
-            return False
-        temperature_raw = self._client.convert_from_registers(data_package.registers, self._client.DATATYPE.INT16)
-        if (temperature_raw == 32767):
-            self.data["masterlowestsupply"] = "Error"
-        else:
-            self.data["masterlowestsupply"] = temperature_raw/10
-        
-        return True
-    
-    def read_modbus_data_master_cooling_locked(self, start_address=322):
-        """start reading data"""
-        data_package = self.read_holding_registers(unit=self._address, address=start_address, count=1) 
-        if data_package.isError():
-            _LOGGER.debug(f'data Error at start address {start_address}')
+    def read_modbus_data_master_cooling_locked(self):
+        """decode the cooling lock"""
+        cooling_locked = self.decode_master_register("coolinglocked")
+        if cooling_locked is None:
             return False
-        value = self._client.convert_from_registers(data_package.registers, self._client.DATATYPE.UINT16)
-        dtc_active = (value != 0)
         
-        self.data["coolinglocked"] = dtc_active
+        self.data["coolinglocked"] = cooling_locked
         
-        return True   
+        return True
\ No newline at end of file
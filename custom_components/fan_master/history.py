@@ -0,0 +1,80 @@
+import math
+from array import array
+
+from .const import HISTORY_KEYS, HISTORY_SIZE, STATUS_OK
+
+
+class RingBuffer:
+    """Fixed size buffer of timestamped samples, the oldest sample is overwritten."""
+
+    __slots__ = ("_timestamps", "_values", "_next", "_count")
+
+    def __init__(self, size=HISTORY_SIZE):
+        """Initialize the buffer."""
+        self._timestamps = array("d", bytes(8 * size))
+        self._values = array("d", bytes(8 * size))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, value):
+        """store a sample, NaN marks a sample without valid value"""
+        self._timestamps[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % len(self._timestamps)
+        self._count = min(self._count + 1, len(self._timestamps))
+
+    def window(self, start, end):
+        """return the samples with start <= timestamp <= end as (timestamp, value), oldest first"""
+        size = len(self._timestamps)
+        first = self._next - self._count
+        samples = []
+        for position in range(first, first + self._count):
+            timestamp = self._timestamps[position % size]
+            if timestamp > end:
+                break
+            if timestamp >= start:
+                samples.append((timestamp, self._values[position % size]))
+        return samples
+
+
+def downsample(samples, resolution):
+    """average the samples per interval of resolution seconds, invalid samples are skipped"""
+    buckets = {}
+    for timestamp, value in samples:
+        bucket = buckets.setdefault(timestamp // resolution * resolution, [0.0, 0])
+        if not math.isnan(value):
+            bucket[0] += value
+            bucket[1] += 1
+    return [
+        (timestamp, value_sum / count if count else math.nan)
+        for timestamp, (value_sum, count) in buckets.items()
+    ]
+
+
+class FanDeviceHistory:
+    """Recent samples of the history fields of one fan device, only kept in memory."""
+
+    def __init__(self):
+        """Initialize one ring buffer per history field."""
+        self._buffers = {key: RingBuffer() for key in HISTORY_KEYS}
+
+    def record(self, timestamp, data, keys):
+        """store the current values of the fields read in this cycle"""
+        for key in keys:
+            if data.status(key) == STATUS_OK:
+                self._buffers[key].append(timestamp, data[key])
+            else:
+                self._buffers[key].append(timestamp, math.nan)
+
+    def window(self, keys, start, end, resolution=None):
+        """return {key: [(timestamp, value or None), ...]} of the time window"""
+        result = {}
+        for key in keys:
+            samples = self._buffers[key].window(start, end)
+            if resolution:
+                samples = downsample(samples, resolution)
+            result[key] = [(timestamp, None if math.isnan(value) else value) for timestamp, value in samples]
+        return result
@@ -0,0 +1,127 @@
+import logging
+from bisect import bisect_left
+from collections import deque
+
+from .const import METRICS_WINDOW, LATENCY_HISTOGRAM_BOUNDS
+
+_LOGGER = logging.getLogger(__name__)
+
+#MBAP header, function code and byte count / exception code
+READ_RESPONSE_OVERHEAD = 9
+WRITE_RESPONSE_SIZE = 12
+ERROR_RESPONSE_SIZE = 9
+
+
+def response_size(response):
+    """return the bytes of a read response on the wire, 0 if there was no response"""
+    if response is None:
+        return 0
+    if response.isError():
+        return ERROR_RESPONSE_SIZE
+    return READ_RESPONSE_OVERHEAD + 2 * len(response.registers)
+
+
+class FanMasterMetrics:
+    """Performance metrics of the poll cycles of a hub and a rolling summary of the last cycles."""
+
+    def __init__(self, master_unit):
+        """Initialize the metrics."""
+        self._master_unit = master_unit
+        self._cycles = deque(maxlen=METRICS_WINDOW)
+        self.reconnects = 0
+        self.overruns = 0
+        self.skipped_cycles = 0
+        #values of the last finished cycle, read by the diagnostic sensors
+        self.data = {}
+        self.slave_latencies = {}
+        #unit -> transactions per latency bucket since the start of the hub, the last bucket has no upper bound
+        self.latency_histograms = {}
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self._transactions = 0
+        self._failed_transactions = 0
+        self._bytes = 0
+        #unit -> [sum of latencies, number of transactions]
+        self._latencies = {}
+
+    def record_transaction(self, unit, latency, failed, size):
+        """count a transaction, writes between two cycles are counted for the next cycle"""
+        self._transactions += 1
+        if failed:
+            self._failed_transactions += 1
+        self._bytes += size
+        latencies = self._latencies.setdefault(unit, [0.0, 0])
+        latencies[0] += latency
+        latencies[1] += 1
+        if unit not in self.latency_histograms:
+            self.latency_histograms[unit] = [0] * (len(LATENCY_HISTOGRAM_BOUNDS) + 1)
+        self.latency_histograms[unit][bisect_left(LATENCY_HISTOGRAM_BOUNDS, 1000 * latency)] += 1
+
+    def record_reconnect(self):
+        """count a successful connect after the connection was lost, not the failed attempts"""
+        self.reconnects += 1
+
+    def record_skipped_cycles(self, count):
+        self.skipped_cycles += count
+
+    def finish_cycle(self, duration, interval):
+        """close the counters of a poll cycle of the given duration [s], interval is the poll interval of the cycle"""
+        overrun = duration > interval
+        if overrun:
+            self.overruns += 1
+            _LOGGER.debug(f'poll cycle took {duration:.3f}s, longer than the poll interval of {interval}s')
+
+        self._cycles.append({
+            "duration": duration,
+            "transactions": self._transactions,
+            "failed_transactions": self._failed_transactions,
+            "bytes": self._bytes,
+            "overrun": overrun,
+        })
+        self.slave_latencies = {
+            unit: round(1000 * latency_sum / count, 1)
+            for unit, (latency_sum, count) in sorted(self._latencies.items())
+            if unit != self._master_unit
+        }
+        self.data = {
+            "cycle_duration": round(duration, 3),
+            "cycle_transactions": self._transactions,
+            "cycle_failed_transactions": self._failed_transactions,
+            "cycle_bytes": self._bytes,
+            "slave_latency": (
+                round(sum(self.slave_latencies.values()) / len(self.slave_latencies), 1)
+                if self.slave_latencies else None
+            ),
+            "reconnects": self.reconnects,
+            "overruns": self.overruns,
+            "skipped_cycles": self.skipped_cycles,
+            "poll_interval": interval,
+        }
+        self._reset_counters()
+
+    def summary(self):
+        """return the rolling summary over the last cycles"""
+        if not self._cycles:
+            return {}
+        cycles = len(self._cycles)
+        durations = [cycle["duration"] for cycle in self._cycles]
+        transactions = sum(cycle["transactions"] for cycle in self._cycles)
+        failed_transactions = sum(cycle["failed_transactions"] for cycle in self._cycles)
+        return {
+            "cycles": cycles,
+            "average_duration": round(sum(durations) / cycles, 3),
+            "max_duration": round(max(durations), 3),
+            "average_transactions": round(transactions / cycles, 1),
+            "failed_transactions": failed_transactions,
+            "failure_rate": round(failed_transactions / transactions, 3) if transactions else 0.0,
+            "average_bytes": round(sum(cycle["bytes"] for cycle in self._cycles) / cycles),
+            "overruns": sum(1 for cycle in self._cycles if cycle["overrun"]),
+        }
+
+    def histograms(self):
+        """return the latency histograms per unit as {unit: {bucket: transactions}}"""
+        labels = [f"<={bound}ms" for bound in LATENCY_HISTOGRAM_BOUNDS] + [f">{LATENCY_HISTOGRAM_BOUNDS[-1]}ms"]
+        return {
+            unit: dict(zip(labels, counts)) for unit, counts in sorted(self.latency_histograms.items())
+        }
@@ -1,5 +1,5 @@
 import logging
-from typing import Optional, Any
+from typing import Optional, Dict, Any
 
 from .const import (
     DOMAIN,
@@ -30,13 +30,17 @@ async def async_setup_entry(hass, entry, async_add_entities) -> None:
         "manufacturer": ATTR_MANUFACTURER,
     }
 
-    entities = []
     
     #no numbers to be added for Master
     
-    #Temp solution: create sensors as configured
-    for slave in hub.slaves:
-        slave_name = f"fan_slave_{slave._address}"
+    @callback
+    def async_add_fan_device(device, added):
+        """create the entities of a newly coded fan device"""
+        if not added:
+            return
+        address = device.address
+        entities = []
+        slave_name = f"fan_slave_{address}"
         slave_device_info = {
             "identifiers": {(DOMAIN, conf_name, slave_name)},
             "name": slave_name,
@@ -47,7 +51,7 @@ async def async_setup_entry(hass, entry, async_add_entities) -> None:
             number = FanDeviceNumber(
                 conf_name,
                 hub,
-                slave._address,
+                device,
                 slave_device_info,
                 number_info[0], #name
                 number_info[1], #key
@@ -60,17 +64,20 @@ async def async_setup_entry(hass, entry, async_add_entities) -> None:
             )
             entities.append(number)
 
-    async_add_entities(entities)
+        async_add_entities(entities)
+
+    entry.async_on_unload(hub.async_add_device_listener(async_add_fan_device))
     return True
 
 class FanDeviceNumber(NumberEntity):
     """Representation of an Fan Master number."""
 
-    def __init__(self, platform_name, hub, device_id, device_info, name, key, address, fmt, unit, minValue, maxValue, numberclass) -> None:
+    def __init__(self, platform_name, hub, device, device_info, name, key, address, fmt, unit, minValue, maxValue, numberclass) -> None:
         """Initialize the selector."""
         self._platform_name = platform_name
         self._hub = hub
-        self._deviceID = device_id
+        self._device = device
+        self._deviceID = device.address
         self._device_info = device_info
         self._name = name
         self._key = key
@@ -82,7 +89,7 @@ class FanDeviceNumber(NumberEntity):
 
     async def async_added_to_hass(self) -> None:
         """Register callbacks."""
-        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated)
+        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated, self._deviceID, [self._key])
 
     async def async_will_remove_from_hass(self) -> None:
         self._hub.async_remove_fanmaster_sensor(self._modbus_data_updated)
@@ -108,13 +115,19 @@ class FanDeviceNumber(NumberEntity):
         """Data is delivered by the hub"""
         return False
 
+    @property
+    def available(self) -> bool:
+        """Return True if the device delivered data within the modbus timeout."""
+        return self._device.available
+
+    @property
+    def device_info(self) -> Optional[Dict[str, Any]]:
+        return self._device_info
+
     @property
     def native_value(self) -> float:
-        try: 
-            if self._key in self._hub.slaves[self._deviceID-1].data:
-                return self._hub.slaves[self._deviceID-1].data[self._key]
-        except IndexError:
-            return None
+        if self._key in self._device.data:
+            return self._device.data[self._key]
 
     async def async_set_native_value(self, value: float) -> None:
         """Change the selected value."""
@@ -134,10 +147,10 @@ class FanDeviceNumber(NumberEntity):
 
         #_LOGGER.debug(f"try to write '{builder.to_registers()}' to location_{self._deviceID} {self._key}")
             
-        response = self._hub.write_register(unit=self._deviceID, address=self._address, payload=payloadData)
-        if response.isError():
+        applied = await self._hub.async_write_register(unit=self._deviceID, address=self._address, payload=payloadData)
+        if not applied:
             _LOGGER.error(f"Could not write value {value} to location_{self._deviceID} {self._key}")
             return
 
-        self._hub.slaves[self._deviceID-1].data[self._key] = value
+        self._device.data[self._key] = value
         self.async_write_ha_state()
@@ -0,0 +1,196 @@
+import struct
+import zlib
+from datetime import timedelta
+
+from .const import (
+    MAX_REGISTERS_PER_READ, MAX_REGISTER_GAP, POLL_TIER_INTERVALS, STATUS_OK, STATUS_ERROR, STATUS_TEXTS
+)
+
+#struct format per datatype (big endian registers, strings get their length)
+_STRUCT_FORMATS = {
+    "u16": "H",
+    "i16": "h",
+    "u32": "I",
+    "u64": "Q",
+    "bool": "H",
+    "enum": "H",
+    "version": "I",
+    "string": "s",
+}
+
+
+def plan_register_blocks(register_types, keys=None, max_gap=MAX_REGISTER_GAP, max_count=MAX_REGISTERS_PER_READ):
+    """group the registers of a register table into the fewest block reads
+
+    registers of the table that are not requested may be read along to bridge a gap,
+    returns a list of [start_address, count, keys] sorted by address
+    """
+    if keys is None:
+        keys = register_types.keys()
+    registers = sorted(
+        (register_types[key][0], register_types[key][1], key) for key in keys
+    )
+    implemented = set()
+    for register_info in register_types.values():
+        implemented.update(range(register_info[0], register_info[0] + register_info[1]))
+
+    blocks = []
+    for address, count, key in registers:
+        if blocks:
+            block = blocks[-1]
+            block_end = block[0] + block[1]
+            new_end = max(block_end, address + count)
+            bridged = (address - block_end <= max_gap) or implemented.issuperset(range(block_end, address))
+            if bridged and (new_end - block[0] <= max_count):
+                block[1] = new_end - block[0]
+                block[2].append(key)
+                continue
+        blocks.append([address, count, [key]])
+
+    return blocks
+
+
+#block plans per register table and set of due poll tiers
+_tier_plans = {}
+
+
+def plan_tier_blocks(register_types, tiers):
+    """plan the block reads of all registers of the given poll tiers, plans are cached"""
+    plan_key = (id(register_types), tiers)
+    if plan_key not in _tier_plans:
+        keys = [key for key, register_info in register_types.items() if register_info[6] in tiers]
+        _tier_plans[plan_key] = plan_register_blocks(register_types, keys)
+    return _tier_plans[plan_key]
+
+
+def due_poll_tiers(tier_timestamps, now, tolerance=0):
+    """return the poll tiers whose interval has expired since they were read the last time"""
+    return frozenset(
+        tier for tier, interval in POLL_TIER_INTERVALS.items()
+        if tier not in tier_timestamps
+        or (now - tier_timestamps[tier]).total_seconds() + tolerance >= interval
+    )
+
+
+def describe_poll_plan(register_types, tier_timestamps):
+    """return the block reads of every poll tier with its interval and next read, e.g. for the diagnostics
+
+    due tiers are read together, so the blocks of a cycle may span several tiers,
+    a tier without next read is read in the next cycle
+    """
+    return {
+        tier: {
+            "interval": interval,
+            "next_read": (
+                (tier_timestamps[tier] + timedelta(seconds=interval)).isoformat() if tier in tier_timestamps else None
+            ),
+            "blocks": [[block[0], block[1], list(block[2])] for block in plan_tier_blocks(register_types, frozenset([tier]))],
+        }
+        for tier, interval in POLL_TIER_INTERVALS.items()
+    }
+
+
+def decode_value(value, datatype, divider, sentinels, maximum):
+    """convert the raw value of one table entry, returns (value, status code)"""
+    if (datatype == "string"):
+        value = value.rstrip(b"\0").decode("utf-8", errors="replace")
+    if value in sentinels:
+        if (datatype == "enum"):
+            return sentinels[value], STATUS_OK
+        return None, sentinels[value]
+    if (maximum is not None and value > maximum):
+        return None, STATUS_ERROR
+    if (datatype == "bool"):
+        return (value != 0), STATUS_OK
+    if (datatype == "version"):
+        return f"{value >> 24}.{(value >> 16) & 0xFF}.{(value >> 8) & 0xFF}", STATUS_OK
+    if (divider is not None):
+        return value/divider, STATUS_OK
+    return value, STATUS_OK
+
+
+class BlockDecoder:
+    """precompiled struct format of a planned register block, decodes all its keys in one unpack"""
+
+    def __init__(self, register_types, block):
+        """Compile the decoder."""
+        start, count, keys = block
+        layout = list(register_types)
+        block_format = ">"
+        position = start
+        #fields of the block format in address order
+        self.fields = []
+        #fields overlapping an other field are unpacked on their own: (Struct, offset, field)
+        self.overlapping_fields = []
+        for key in sorted(keys, key=lambda key: register_types[key][0]):
+            address, register_count, datatype, divider, sentinels, maximum = register_types[key][:6]
+            field_format = f"{2 * register_count}s" if datatype == "string" else _STRUCT_FORMATS[datatype]
+            field = (key, layout.index(key), (datatype, divider, sentinels, maximum))
+            if address < position:
+                self.overlapping_fields.append((struct.Struct(">" + field_format), 2 * (address - start), field))
+                continue
+            if address > position:
+                block_format += f"{2 * (address - position)}x"
+            block_format += field_format
+            position = address + register_count
+            self.fields.append(field)
+        if position < start + count:
+            block_format += f"{2 * (start + count - position)}x"
+        self.block_struct = struct.Struct(block_format)
+
+    def decode(self, raw, reads):
+        """decode the packed registers of several reads of the block into their data
+
+        the data is a FieldStore (value and status code by field index) or a dict
+        (reported value, status text instead of the value)
+        """
+        fields = self.fields + [field for _field_struct, _offset, field in self.overlapping_fields]
+        for index, values in enumerate(self.block_struct.iter_unpack(raw)):
+            data = reads[index]
+            if self.overlapping_fields:
+                values += tuple(
+                    field_struct.unpack_from(raw, index * self.block_struct.size + offset)[0]
+                    for field_struct, offset, _field in self.overlapping_fields
+                )
+            if isinstance(data, dict):
+                for field, value in zip(fields, values):
+                    value, status = decode_value(value, *field[2])
+                    data[field[0]] = value if status == STATUS_OK else STATUS_TEXTS[status]
+            else:
+                for field, value in zip(fields, values):
+                    data.set_field(field[1], *decode_value(value, *field[2]))
+
+
+#compiled decoders per register table and block
+_block_decoders = {}
+
+
+def get_block_decoder(register_types, block):
+    """return the cached decoder of a planned block"""
+    decoder_key = (id(register_types), block[0], block[1], tuple(block[2]))
+    if decoder_key not in _block_decoders:
+        _block_decoders[decoder_key] = BlockDecoder(register_types, block)
+    return _block_decoders[decoder_key]
+
+
+def decode_register_blocks(register_types, reads):
+    """decode block reads in one batch, e.g. the blocks of all fan devices of a cycle
+
+    reads is a list of (block, registers, data), reads of the same block are
+    packed together and unpacked with one call of the precompiled block format
+    """
+    batches = {}
+    for block, registers, data in reads:
+        decoder = get_block_decoder(register_types, block)
+        batch = batches.setdefault(id(decoder), (decoder, [], []))
+        batch[1].extend(registers)
+        batch[2].append(data)
+
+    for decoder, registers, datas in batches.values():
+        raw = struct.pack(f">{len(registers)}H", *registers)
+        decoder.decode(raw, datas)
+
+
+def register_map_id(*register_tables):
+    """return an identifier of the register tables, it changes with any change of the tables"""
+    return f"{zlib.crc32(repr(register_tables).encode()):08x}"
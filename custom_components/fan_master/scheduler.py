@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import math
+
+from homeassistant.core import callback
+
+from .const import DOMAIN, POLL_INTERVAL_HEADROOM, POLL_INTERVAL_SMOOTHING, MAX_CONCURRENT_CYCLES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FanMasterPollCoordinator:
+    """Spreads the poll cycles of all hubs over the poll interval and limits the cycles running at once.
+
+    One coordinator is kept in hass.data[DOMAIN], the hubs get evenly spaced
+    phases of their poll interval, so hubs with the same interval do not
+    start their cycles together.
+    """
+
+    def __init__(self, hass, max_concurrent=MAX_CONCURRENT_CYCLES):
+        """Initialize the coordinator."""
+        #start of the poll grids of all hubs in event loop time
+        self.epoch = hass.loop.time()
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self._schedulers = []
+
+    @callback
+    def async_register(self, scheduler):
+        self._schedulers.append(scheduler)
+        self._async_update_phases()
+
+    @callback
+    def async_unregister(self, scheduler):
+        if scheduler in self._schedulers:
+            self._schedulers.remove(scheduler)
+            self._async_update_phases()
+
+    @callback
+    def _async_update_phases(self):
+        for index, scheduler in enumerate(self._schedulers):
+            scheduler.async_set_phase(index / len(self._schedulers))
+
+
+class FanMasterPollScheduler:
+    """Runs the poll cycles of a hub one after the other.
+
+    The cycles start on a grid of the poll interval, shifted by the phase the
+    coordinator assigned to the hub, so the timer does not drift. A cycle is
+    never started while the previous one is still running, starts missed by a
+    long cycle are skipped. The poll interval follows the average cycle
+    duration between the scan interval and the max scan interval.
+    """
+
+    def __init__(self, hass, name, poll, metrics, scan_interval, max_scan_interval, coordinator=None):
+        """Initialize the scheduler, without coordinator the hub is scheduled on its own."""
+        self._hass = hass
+        self._name = name
+        self._poll = poll
+        self._metrics = metrics
+        self._coordinator = coordinator if coordinator is not None else FanMasterPollCoordinator(hass, 1)
+        self._min_interval = scan_interval
+        self._max_interval = max(scan_interval, max_scan_interval)
+        self.interval = scan_interval
+        #part of the poll interval the grid of this hub is shifted by
+        self._phase = 0.0
+        self._average_duration = None
+        #planned start of the next cycle in event loop time, None if stopped
+        self._next_start = None
+        self._timer = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._next_start is not None
+
+    def _grid_start(self, earliest):
+        """return the first start on the grid of this hub at or after earliest"""
+        offset = self._coordinator.epoch + self._phase * self.interval
+        return offset + math.ceil((earliest - offset) / self.interval) * self.interval
+
+    @callback
+    def async_start(self):
+        """start the cycles on the next start of the grid"""
+        if self._next_start is not None:
+            return
+        self._next_start = self._hass.loop.time()
+        self._coordinator.async_register(self)
+        #a cycle still running from before the last stop schedules the next one itself
+        if self._task is None and self._timer is None:
+            self._next_start = self._grid_start(self._hass.loop.time())
+            self._schedule()
+
+    @callback
+    def async_stop(self):
+        """stop the cycles, a running cycle is finished"""
+        self._next_start = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._coordinator.async_unregister(self)
+
+    @callback
+    def async_set_phase(self, phase):
+        """shift the grid, a waiting start is moved to the new grid"""
+        self._phase = phase
+        if self._timer is not None:
+            self._timer.cancel()
+            self._next_start = self._grid_start(self._hass.loop.time())
+            self._schedule()
+
+    def _schedule(self):
+        self._timer = self._hass.loop.call_at(self._next_start, self._start_cycle)
+
+    @callback
+    def _start_cycle(self):
+        self._timer = None
+        self._task = self._hass.async_create_background_task(
+            self._async_run_cycle(), f"{DOMAIN} {self._name} poll cycle"
+        )
+
+    async def _async_run_cycle(self):
+        planned_start = self._next_start
+        start = self._hass.loop.time()
+        try:
+            #the cycles of other hubs beyond the limit are finished first
+            async with self._coordinator.semaphore:
+                start = self._hass.loop.time()
+                await self._poll()
+        except Exception:
+            _LOGGER.exception("Error in poll cycle")
+        finally:
+            self._task = None
+        self._adapt_interval(self._hass.loop.time() - start)
+
+        if self._next_start is None:
+            return
+        #half an interval tolerance, so the next start is not taken twice if the grid changed with the interval
+        self._next_start = self._grid_start(planned_start + self.interval / 2)
+        now = self._hass.loop.time()
+        if self._next_start < now:
+            #the cycles do not run back to back to catch up, the missed starts are skipped
+            next_start = self._grid_start(now)
+            missed = round((next_start - self._next_start) / self.interval)
+            self._metrics.record_skipped_cycles(missed)
+            self._next_start = next_start
+            _LOGGER.debug(f'poll cycle overrun, {missed} cycle(s) skipped')
+        self._schedule()
+
+    def _adapt_interval(self, duration):
+        """follow the average cycle duration with some headroom, within the configured bounds"""
+        if self._average_duration is None:
+            self._average_duration = duration
+        else:
+            self._average_duration += POLL_INTERVAL_SMOOTHING * (duration - self._average_duration)
+        interval = round(
+            min(max(self._average_duration * POLL_INTERVAL_HEADROOM, self._min_interval), self._max_interval), 1
+        )
+        if interval != self.interval:
+            _LOGGER.debug(f'poll interval {self.interval}s -> {interval}s, average cycle {self._average_duration:.3f}s')
+            self.interval = interval
@@ -1,15 +1,18 @@
 import logging
 from typing import Optional, Dict, Any
 from .const import (
-    MAX_DEVICES,
     FANMASTER_SENSOR_TYPES,
+    FANMASTER_METRIC_SENSOR_TYPES,
+    FANMASTER_CONNECTION_SENSOR_TYPE,
+    CONNECTION_STATES,
+    METRIC_TOTAL_KEYS,
     FANDEVICE_SENSOR_TYPES,
     DOMAIN,
     ATTR_MANUFACTURER,
 )
 from datetime import datetime
 from homeassistant.helpers.entity import Entity
-from homeassistant.const import CONF_NAME, UnitOfEnergy, UnitOfPower
+from homeassistant.const import CONF_NAME, UnitOfEnergy, UnitOfPower, EntityCategory
 from homeassistant.components.sensor import (
     PLATFORM_SCHEMA,
     SensorEntity,
@@ -48,13 +51,23 @@ async def async_setup_entry(hass, entry, async_add_entities):
             )
             entities.append(sensor)
     
-    for i in range(1,MAX_DEVICES+1):
-        sensor = FanMasterSensor(conf_name, hub, device_info, f"Location {i}", f"location_{i}", None, None, None)
-        entities.append(sensor)
-        
-    #Temp solution: create sensors as configured
-    for slave in hub.slaves:
-        slave_name = f"fan_slave_{slave._address}"
+    for metric_info in FANMASTER_METRIC_SENSOR_TYPES.values():
+        entities.append(FanMasterMetricSensor(conf_name, hub, device_info, *metric_info))
+    entities.append(FanMasterConnectionSensor(conf_name, hub, device_info, *FANMASTER_CONNECTION_SENSOR_TYPE))
+
+    async_add_entities(entities)
+
+    @callback
+    def async_add_fan_device(device, added):
+        """create the entities of a newly coded fan device"""
+        if not added:
+            return
+        address = device.address
+        #the location of a fan device is kept by the master
+        entities = [
+            FanMasterSensor(conf_name, hub, device_info, f"Location {address}", f"location_{address}", None, None, None)
+        ]
+        slave_name = f"fan_slave_{address}"
         slave_device_info = {
             "identifiers": {(DOMAIN, conf_name, slave_name)},
             "name": slave_name,
@@ -66,7 +79,7 @@ async def async_setup_entry(hass, entry, async_add_entities):
                 sensor = FanDeviceSensor(
                     conf_name,
                     hub,
-                    slave._address,
+                    device,
                     slave_device_info,
                     slave_sensor_info[1],
                     slave_sensor_info[2],
@@ -76,7 +89,9 @@ async def async_setup_entry(hass, entry, async_add_entities):
                 )
                 entities.append(sensor)
     
-    async_add_entities(entities)
+        async_add_entities(entities)
+
+    entry.async_on_unload(hub.async_add_device_listener(async_add_fan_device))
     return True
 
 class SensorBase(SensorEntity):
@@ -92,11 +107,13 @@ class SensorBase(SensorEntity):
         self._attr_device_class = sensorclass
         self._icon = icon
         self._device_info = device_info
+        self._deviceID = None
+        self._device = None
         self._attr_state_class = SensorStateClass.MEASUREMENT
 
     async def async_added_to_hass(self):
         """Register callbacks."""
-        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated)
+        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated, self._deviceID, [self._key])
 
     async def async_will_remove_from_hass(self) -> None:
         self._hub.async_remove_fanmaster_sensor(self._modbus_data_updated)
@@ -125,6 +142,13 @@ class SensorBase(SensorEntity):
         """Data is delivered by the hub"""
         return False
 
+    @property
+    def available(self) -> bool:
+        """Return True if the device delivered data within the modbus timeout."""
+        if self._device is not None:
+            return self._device.available
+        return self._hub.available
+
     @property
     def device_info(self) -> Optional[Dict[str, Any]]:
         return self._device_info
@@ -152,14 +176,73 @@ class FanMasterSensor(SensorBase):
                 return None
             return self._hub.data[self._key]
             
-        
-        
-        
+
+
+
+class FanMasterMetricSensor(FanMasterSensor):
+    """Diagnostic sensor of the poll cycle metrics of the hub."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, platform_name, hub, device_info, name, key, unit, sensorclass, icon):
+        super().__init__(platform_name, hub, device_info, name, key, unit, sensorclass, icon)
+        """Initialize the sensor."""
+        if key in METRIC_TOTAL_KEYS:
+            self._attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    @property
+    def available(self) -> bool:
+        """Metrics are available once the first poll cycle is finished, also if it failed."""
+        return self._key in self._hub.metrics.data
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return self._hub.metrics.data.get(self._key)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the rolling summary and the latency per fan device."""
+        if self._key == "cycle_duration":
+            return self._hub.metrics.summary()
+        if self._key == "slave_latency":
+            return {f"slave_{address}": latency for address, latency in self._hub.metrics.slave_latencies.items()}
+        return None
+
+
+class FanMasterConnectionSensor(FanMasterSensor):
+    """Diagnostic sensor of the connection state to the gateway."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_options = CONNECTION_STATES
+
+    def __init__(self, platform_name, hub, device_info, name, key, unit, sensorclass, icon):
+        super().__init__(platform_name, hub, device_info, name, key, unit, sensorclass, icon)
+        """Initialize the sensor."""
+        self._attr_state_class = None
+
+    @property
+    def available(self) -> bool:
+        """The connection state is also known while the gateway is down."""
+        return True
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return self._hub.connection.state
+
+    @property
+    def extra_state_attributes(self):
+        """Return the time of the last change, the failed attempts and the time to the next one."""
+        return self._hub.connection.attributes
+
+
 class FanDeviceSensor(SensorBase):
-    def __init__(self, platform_name, hub, device_id, device_info, name, key, unit, sensorclass, icon):
+    def __init__(self, platform_name, hub, device, device_info, name, key, unit, sensorclass, icon):
         super().__init__(platform_name, hub, device_info, name, key, unit, sensorclass, icon)
         """Initialize the sensor."""
-        self._deviceID = device_id
+        self._device = device
+        self._deviceID = device.address
         
     @property
     def name(self):
@@ -176,10 +259,7 @@ class FanDeviceSensor(SensorBase):
     @property
     def state(self):
         """Return the state of the sensor."""
-        try: 
-            if self._key in self._hub.slaves[self._deviceID-1].data:
-                if (self._hub.slaves[self._deviceID-1].data[self._key] == "Error"):
-                    return None
-                return self._hub.slaves[self._deviceID-1].data[self._key]
-        except IndexError:
-            return None
\ No newline at end of file
+        if self._key in self._device.data:
+            if (self._device.data[self._key] == "Error"):
+                return None
+            return self._device.data[self._key]
\ No newline at end of file
@@ -0,0 +1,87 @@
+from collections.abc import Mapping
+
+from .const import STATUS_OK, STATUS_NOT_READ, STATUS_INVALID, STATUS_TEXTS
+
+
+class FieldLayout:
+    """Fixed field order of a register table, shared by all records of the table."""
+
+    __slots__ = ("keys", "index")
+
+    def __init__(self, register_types):
+        """Initialize the layout."""
+        self.keys = tuple(register_types)
+        self.index = {key: index for index, key in enumerate(self.keys)}
+
+
+class FieldStore(Mapping):
+    """Decoded fields of one device in a fixed layout record.
+
+    Values and status codes are kept in arrays indexed by field. Read as a
+    mapping, a field that was not read yet is missing, a field with a status
+    other than STATUS_OK reports its status text ("Error", "NotAttached", ...)
+    like the former data dicts, so entities can keep using it as a dict.
+    """
+
+    __slots__ = ("_layout", "_values", "_status")
+
+    def __init__(self, layout):
+        """Initialize the record, all fields are not read."""
+        self._layout = layout
+        self._values = [None] * len(layout.keys)
+        self._status = bytearray([STATUS_NOT_READ]) * len(layout.keys)
+
+    def __getitem__(self, key):
+        index = self._layout.index[key]
+        status = self._status[index]
+        if status == STATUS_OK:
+            return self._values[index]
+        if status == STATUS_NOT_READ:
+            raise KeyError(key)
+        return STATUS_TEXTS[status]
+
+    def __setitem__(self, key, value):
+        """set a value assumed to be valid, e.g. optimistic after a write"""
+        self.set_field(self._layout.index[key], value, STATUS_OK)
+
+    def __contains__(self, key):
+        index = self._layout.index.get(key)
+        return index is not None and self._status[index] != STATUS_NOT_READ
+
+    def __iter__(self):
+        for key, status in zip(self._layout.keys, self._status):
+            if status != STATUS_NOT_READ:
+                yield key
+
+    def __len__(self):
+        return len(self._status) - self._status.count(STATUS_NOT_READ)
+
+    def status(self, key):
+        """return the status code of a field"""
+        return self._status[self._layout.index[key]]
+
+    def set_field(self, index, value, status):
+        self._values[index] = value if status == STATUS_OK else None
+        self._status[index] = status
+
+    def invalidate(self):
+        """mark all read fields invalid, they are reported as None"""
+        for index, status in enumerate(self._status):
+            if status != STATUS_NOT_READ:
+                self._status[index] = STATUS_INVALID
+                self._values[index] = None
+
+    def snapshot(self):
+        """return a copy of the values and status codes to detect changes"""
+        return (tuple(self._values), bytes(self._status))
+
+    def changed_keys(self, snapshot):
+        """return the keys whose value or status differs from the snapshot"""
+        values, status = snapshot
+        if status == self._status and values == tuple(self._values):
+            return []
+        return [
+            key for key, old_value, old_status, value, new_status
+            in zip(self._layout.keys, values, status, self._values, self._status)
+            if old_status != new_status or old_value != value
+        ]
@@ -30,13 +30,17 @@ async def async_setup_entry(hass, entry, async_add_entities) -> None:
         "manufacturer": ATTR_MANUFACTURER,
     }
 
-    entities = []
     
     #no switches to be added for Master
     
-    #Temp solution: create sensors as configured
-    for slave in hub.slaves:
-        slave_name = f"fan_slave_{slave._address}"
+    @callback
+    def async_add_fan_device(device, added):
+        """create the entities of a newly coded fan device"""
+        if not added:
+            return
+        address = device.address
+        entities = []
+        slave_name = f"fan_slave_{address}"
         slave_device_info = {
             "identifiers": {(DOMAIN, conf_name, slave_name)},
             "name": slave_name,
@@ -47,7 +51,7 @@ async def async_setup_entry(hass, entry, async_add_entities) -> None:
             switch = FanDeviceSwitch(
                 conf_name,
                 hub,
-                slave._address,
+                device,
                 slave_device_info,
                 switch_info[0], #name
                 switch_info[1], #key
@@ -55,17 +59,20 @@ async def async_setup_entry(hass, entry, async_add_entities) -> None:
             )
             entities.append(switch)
 
-    async_add_entities(entities)
+        async_add_entities(entities)
+
+    entry.async_on_unload(hub.async_add_device_listener(async_add_fan_device))
     return True
 
 class FanDeviceSwitch(SwitchEntity):
     """Representation of an Fan Master number."""
 
-    def __init__(self, platform_name, hub, device_id, device_info, name, key, address) -> None:
+    def __init__(self, platform_name, hub, device, device_info, name, key, address) -> None:
         """Initialize the selector."""
         self._platform_name = platform_name
         self._hub = hub
-        self._deviceID = device_id
+        self._device = device
+        self._deviceID = device.address
         self._device_info = device_info
         self._name = name
         self._key = key
@@ -74,7 +81,7 @@ class FanDeviceSwitch(SwitchEntity):
 
     async def async_added_to_hass(self) -> None:
         """Register callbacks."""
-        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated)
+        self._hub.async_add_fanmaster_sensor(self._modbus_data_updated, self._deviceID, [self._key])
 
     async def async_will_remove_from_hass(self) -> None:
         self._hub.async_remove_fanmaster_sensor(self._modbus_data_updated)
@@ -100,13 +107,19 @@ class FanDeviceSwitch(SwitchEntity):
         """Data is delivered by the hub"""
         return False
 
+    @property
+    def available(self) -> bool:
+        """Return True if the device delivered data within the modbus timeout."""
+        return self._device.available
+
+    @property
+    def device_info(self) -> Optional[Dict[str, Any]]:
+        return self._device_info
+
     @property
     def native_value(self) -> float:
-        try: 
-            if self._key in self._hub.slaves[self._deviceID-1].data:
-                return self._hub.slaves[self._deviceID-1].data[self._key]
-        except IndexError:
-            return 
+        if self._key in self._device.data:
+            return self._device.data[self._key] 
         
     
     async def async_turn_on(self) -> None:
@@ -118,12 +131,12 @@ class FanDeviceSwitch(SwitchEntity):
         
         _LOGGER.debug(f"try to write '{builder.to_registers()}' to location_{self._deviceID} {self._key}")
             
-        response = self._hub.write_registers(unit=self._deviceID, address=self._address, payload=builder.to_registers())
-        if response.isError():
+        applied = await self._hub.async_write_registers(unit=self._deviceID, address=self._address, payload=builder.to_registers())
+        if not applied:
             _LOGGER.error(f"Could not write value {value} to location_{self._deviceID} {self._key}")
             return
 
-        self._hub.slaves[self._deviceID-1].data[self._key] = True
+        self._device.data[self._key] = True
         self.async_write_ha_state()
         
         
@@ -136,10 +149,10 @@ class FanDeviceSwitch(SwitchEntity):
         
         _LOGGER.debug(f"try to write '{builder.to_registers()}' to location_{self._deviceID} {self._key}")
             
-        response = self._hub.write_registers(unit=self._deviceID, address=self._address, payload=builder.to_registers())
-        if response.isError():
+        applied = await self._hub.async_write_registers(unit=self._deviceID, address=self._address, payload=builder.to_registers())
+        if not applied:
             _LOGGER.error(f"Could not write value {value} to location_{self._deviceID} {self._key}")
             return
 
-        self._hub.slaves[self._deviceID-1].data[self._key] = False
+        self._device.data[self._key] = False
         self.async_write_ha_state()
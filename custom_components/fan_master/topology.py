@@ -0,0 +1,59 @@
+import logging
+
+from homeassistant.helpers.storage import Store
+from homeassistant.util import slugify
+
+from .const import (
+    DOMAIN, MAX_DEVICES, STATUS_TEXTS, TOPOLOGY_STORAGE_VERSION, TOPOLOGY_SAVE_DELAY,
+    FANMASTER_REGISTER_TYPES, FANMASTER_LOCATION_TYPES, FANDEVICE_REGISTER_TYPES
+)
+from .registermap import register_map_id
+
+_LOGGER = logging.getLogger(__name__)
+
+#a cache written for other register tables is not used
+REGISTER_MAP_ID = register_map_id(FANMASTER_REGISTER_TYPES, FANMASTER_LOCATION_TYPES, FANDEVICE_REGISTER_TYPES)
+#location values that are no location string
+INVALID_LOCATIONS = {"not coded", *STATUS_TEXTS.values()}
+
+
+class FanMasterTopology:
+    """Last known coding list, locations and firmware versions of a hub in the Home Assistant storage.
+
+    stored as {"register_map": id, "coding_list": [address, ...], "locations": {address: location},
+    "firmware": {"master": {key: version}, "slaves": {address: version}}}, addresses as strings
+    """
+
+    def __init__(self, hass, name):
+        """Initialize the cache."""
+        self._store = Store(hass, TOPOLOGY_STORAGE_VERSION, f"{DOMAIN}.{slugify(name)}_topology")
+        self._data = None
+
+    async def async_load(self):
+        """return the cached topology, None if there is none or it does not fit the register map"""
+        data = await self._store.async_load()
+        if data is None:
+            return None
+        if data.get("register_map") != REGISTER_MAP_ID:
+            _LOGGER.info("cached topology was stored for another register map, it is not used")
+            return None
+        self._data = data
+        return data
+
+    def async_update(self, data):
+        """schedule a write if the topology differs from the cached one"""
+        data = dict(data, register_map=REGISTER_MAP_ID)
+        if data == self._data:
+            return
+        _LOGGER.debug(f'topology changed, coded fan devices: {data["coding_list"]}')
+        self._data = data
+        self._store.async_delay_save(lambda: self._data, TOPOLOGY_SAVE_DELAY)
+
+    async def async_remove(self):
+        """remove the cache, e.g. when the config entry is removed"""
+        await self._store.async_remove()
+
+
+def topology_addresses(data):
+    """return the coded addresses of a cached topology, invalid entries are skipped"""
+    return [address for address in data.get("coding_list", []) if 1 <= address <= MAX_DEVICES]
@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import struct
+import threading
+
+from pymodbus.client import ModbusTcpClient, AsyncModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+from .const import REQUEST_RETRIES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FanMasterSyncTransport:
+    """Thread safe wrapper for the sync pymodbus client, requests run in the executor."""
+
+    pipelined = False
+
+    def __init__(self, hass, host, port, timeout):
+        """Initialize the transport."""
+        self._hass = hass
+        self._client = ModbusTcpClient(host=host, port=port, timeout=timeout, retries=REQUEST_RETRIES)
+        self._lock = threading.Lock()
+
+    @property
+    def host(self):
+        return self._client.comm_params.host
+
+    @property
+    def port(self):
+        return self._client.comm_params.port
+
+    @property
+    def connected(self):
+        return self._client.connected
+
+    @property
+    def socket(self):
+        return self._client.socket
+
+    def _connect(self):
+        with self._lock:
+            return self._client.connect()
+
+    def _close(self):
+        with self._lock:
+            self._client.close()
+
+    def _read_holding_registers(self, unit, address, count):
+        with self._lock:
+            return self._client.read_holding_registers(address=address, count=count, slave=unit)
+
+    def _write_registers(self, unit, address, payload):
+        with self._lock:
+            return self._client.write_registers(address=address, values=payload, slave=unit)
+
+    def _write_register(self, unit, address, payload):
+        with self._lock:
+            return self._client.write_register(address=address, value=payload, slave=unit)
+
+    async def async_connect(self):
+        return await self._hass.async_add_executor_job(self._connect)
+
+    async def async_close(self):
+        await self._hass.async_add_executor_job(self._close)
+
+    async def async_read_holding_registers(self, unit, address, count):
+        return await self._hass.async_add_executor_job(self._read_holding_registers, unit, address, count)
+
+    async def async_write_registers(self, unit, address, payload):
+        return await self._hass.async_add_executor_job(self._write_registers, unit, address, payload)
+
+    async def async_write_register(self, unit, address, payload):
+        return await self._hass.async_add_executor_job(self._write_register, unit, address, payload)
+
+
+class FanMasterAsyncTransport:
+    """Wrapper for the asyncio pymodbus client, requests run on the event loop."""
+
+    pipelined = False
+
+    def __init__(self, hass, host, port, timeout):
+        """Initialize the transport."""
+        self._hass = hass
+        #reconnects are handled by the connection manager of the hub
+        self._client = AsyncModbusTcpClient(
+            host=host, port=port, timeout=timeout, retries=REQUEST_RETRIES, reconnect_delay=0,
+            trace_connect=self._connection_changed
+        )
+        self._requests = 0
+
+    @property
+    def host(self):
+        return self._client.comm_params.host
+
+    @property
+    def port(self):
+        return self._client.comm_params.port
+
+    @property
+    def connected(self):
+        transport = self._client.ctx.transport
+        return transport is not None and not transport.is_closing()
+
+    @property
+    def socket(self):
+        transport = self._client.ctx.transport
+        return transport.get_extra_info("socket") if transport is not None else None
+
+    async def async_connect(self):
+        return await self._client.connect()
+
+    async def async_close(self):
+        self._client.close()
+
+    def _connection_changed(self, connected):
+        """fail the request in flight once the connection is lost, pymodbus would wait the timeout and retry it"""
+        if connected or not self._requests:
+            return
+        response_future = self._client.ctx.response_future
+        if not response_future.done():
+            response_future.set_exception(ConnectionException(f"connection to {self.host}:{self.port} lost"))
+
+    async def _async_request(self, request):
+        #pymodbus drops a request on a lost connection and waits the full timeout for its response
+        if not self.connected:
+            raise ConnectionException(f"not connected to {self.host}:{self.port}")
+        self._requests += 1
+        try:
+            return await request
+        finally:
+            self._requests -= 1
+
+    #the pymodbus transaction manager serializes the requests of one client
+    async def async_read_holding_registers(self, unit, address, count):
+        return await self._async_request(self._client.read_holding_registers(address=address, count=count, slave=unit))
+
+    async def async_write_registers(self, unit, address, payload):
+        return await self._async_request(self._client.write_registers(address=address, values=payload, slave=unit))
+
+    async def async_write_register(self, unit, address, payload):
+        return await self._async_request(self._client.write_register(address=address, value=payload, slave=unit))
+
+
+class FanMasterResponse:
+    """Response of the pipelined transport, compatible to the used parts of the pymodbus responses."""
+
+    def __init__(self, function_code, registers=None, exception_code=0):
+        """Initialize the response."""
+        self.function_code = function_code
+        self.registers = registers if registers is not None else []
+        self.exception_code = exception_code
+
+    def isError(self):
+        return self.function_code > 0x80
+
+
+class FanMasterPipelinedTransport:
+    """Modbus TCP client that keeps several requests in flight on one connection.
+
+    Responses are matched to their requests by the MBAP transaction id, so the
+    gateway can answer the requests to different units in any order.
+    """
+
+    pipelined = True
+
+    def __init__(self, hass, host, port, timeout, window):
+        """Initialize the transport."""
+        self._hass = hass
+        self._host = host
+        self._port = int(port)
+        self._timeout = timeout
+        self._window = asyncio.Semaphore(window)
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._transaction_id = 0
+        #transaction id -> future of the response
+        self._in_flight = {}
+
+    @property
+    def host(self):
+        return self._host
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def socket(self):
+        return self._writer.get_extra_info("socket") if self._writer is not None else None
+
+    async def async_connect(self):
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port), self._timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            _LOGGER.debug(f'connect to {self._host}:{self._port} failed: {e}')
+            self._reader = self._writer = None
+            return False
+        self._read_task = self._hass.async_create_background_task(
+            self._async_read_responses(self._reader), f"fan_master pipelined reader {self._host}"
+        )
+        return True
+
+    async def async_close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._reader = None
+        self._fail_in_flight(ConnectionException("connection closed"))
+
+    def _fail_in_flight(self, exception):
+        for future in self._in_flight.values():
+            if not future.done():
+                future.set_exception(exception)
+        self._in_flight = {}
+
+    async def _async_read_responses(self, reader):
+        """receive the responses and hand them to the waiting requests"""
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                transaction_id, _protocol_id, length, _unit = struct.unpack(">HHHB", header)
+                pdu = await reader.readexactly(length - 1)
+                future = self._in_flight.pop(transaction_id, None)
+                if future is None or future.done():
+                    _LOGGER.debug(f'response with unknown transaction id {transaction_id} dropped')
+                    continue
+                future.set_result(pdu)
+        except (asyncio.IncompleteReadError, OSError) as e:
+            _LOGGER.debug(f'connection to {self._host}:{self._port} lost: {e}')
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._fail_in_flight(ConnectionException("connection lost"))
+
+    async def _async_execute(self, unit, pdu):
+        """send a request pdu and wait for its response pdu, the window limits the requests in flight"""
+        async with self._window:
+            if not self.connected:
+                raise ConnectionException(f"not connected to {self._host}:{self._port}")
+            self._transaction_id = (self._transaction_id + 1) & 0xFFFF
+            transaction_id = self._transaction_id
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[transaction_id] = future
+            self._writer.write(struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, unit) + pdu)
+            try:
+                return await asyncio.wait_for(future, self._timeout)
+            except asyncio.TimeoutError:
+                raise ModbusIOException(f"no response of unit {unit} within {self._timeout}s")
+            finally:
+                self._in_flight.pop(transaction_id, None)
+
+    @staticmethod
+    def _exception_response(pdu):
+        if pdu[0] > 0x80:
+            return FanMasterResponse(pdu[0], exception_code=pdu[1])
+        return None
+
+    async def async_read_holding_registers(self, unit, address, count):
+        pdu = await self._async_execute(unit, struct.pack(">BHH", 0x03, address, count))
+        response = self._exception_response(pdu)
+        if response is not None:
+            return response
+        return FanMasterResponse(pdu[0], list(struct.unpack(f">{pdu[1] // 2}H", pdu[2:2 + pdu[1]])))
+
+    async def async_write_registers(self, unit, address, payload):
+        request = struct.pack(f">BHHB{len(payload)}H", 0x10, address, len(payload), 2 * len(payload), *payload)
+        pdu = await self._async_execute(unit, request)
+        return self._exception_response(pdu) or FanMasterResponse(pdu[0])
+
+    async def async_write_register(self, unit, address, payload):
+        pdu = await self._async_execute(unit, struct.pack(">BHH", 0x06, address, payload))
+        return self._exception_response(pdu) or FanMasterResponse(pdu[0], [payload])
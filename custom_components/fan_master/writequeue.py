@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+
+import pymodbus
+
+from .const import CONNECTION_STATE_CONNECTED
+from .metrics import WRITE_RESPONSE_SIZE, ERROR_RESPONSE_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FanMasterWriteQueue:
+    """Queue of register writes, repeated writes to the same register are coalesced to the latest value."""
+
+    def __init__(self, transport, metrics, connection):
+        """Initialize the write queue."""
+        self._transport = transport
+        self._metrics = metrics
+        self._connection = connection
+        self._lock = asyncio.Lock()
+        #(unit, address) -> [payload, multiple, future], in order of the first write
+        self._pending = {}
+
+    @property
+    def pending(self):
+        """Return True if writes are waiting."""
+        return bool(self._pending)
+
+    def async_enqueue(self, unit, address, payload, multiple=False):
+        """queue a write, the returned future is set to True once the latest value is applied"""
+        write_key = (unit, address)
+        if write_key in self._pending:
+            _LOGGER.debug(f'coalesce write to unit {unit} address {address}')
+            pending_write = self._pending[write_key]
+            pending_write[0] = payload
+            pending_write[1] = multiple
+            return pending_write[2]
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[write_key] = [payload, multiple, future]
+        return future
+
+    async def async_process(self):
+        """write all pending registers"""
+        async with self._lock:
+            while self._pending:
+                write_key = next(iter(self._pending))
+                payload, multiple, future = self._pending.pop(write_key)
+                unit, address = write_key
+                if self._connection.state != CONNECTION_STATE_CONNECTED:
+                    #the gateway went down while the write was queued, no connect is tried for it
+                    _LOGGER.debug(f'not connected, write to unit {unit} address {address} dropped')
+                    if not future.done():
+                        future.set_result(False)
+                    continue
+                start = time.monotonic()
+                size = 0
+                responded = False
+                try:
+                    if multiple:
+                        response = await self._transport.async_write_registers(unit, address, payload)
+                    else:
+                        response = await self._transport.async_write_register(unit, address, payload)
+                    result = not response.isError()
+                    responded = True
+                    size = WRITE_RESPONSE_SIZE if result else ERROR_RESPONSE_SIZE
+                except pymodbus.exceptions.ModbusIOException as e:
+                    _LOGGER.debug(f'no response of unit {unit} to the write at address {address}: {e}')
+                    result = False
+                except pymodbus.exceptions.ConnectionException as e:
+                    #the connection state already tells that the gateway is down
+                    _LOGGER.debug(f'Error writing unit {unit} address {address}: {e}')
+                    result = False
+                except Exception as e:
+                    _LOGGER.warning(f'Error writing unit {unit} address {address}: {e}')
+                    result = False
+                self._metrics.record_transaction(unit, time.monotonic() - start, not result, size)
+                if responded:
+                    self._connection.record_response()
+                else:
+                    #a dead gateway is closed by the liveness probe, the remaining writes are dropped
+                    await self._connection.async_record_timeout()
+
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,225 @@
+"""Poll cycle benchmark of the Fan Master hub.
+
+Runs the poll cycle of the hub (FanMaster.async_read_modbus_data) against
+the gateway simulator with 1, 2, 10 and 30 fan devices and reports per cycle
+the Modbus transactions, the bytes on the wire, the wall time and the CPU
+time of the hub:
+
+    python tools/benchmark.py
+    python tools/benchmark.py --write-baseline
+    python tools/benchmark.py --compare
+
+The first cycle reads all poll tiers ("initial"), the following cycles only
+the tiers that are due within the scan interval ("steady"). The simulator
+runs in its own thread, its CPU time is not counted for the hub. Needs
+Home Assistant and pymodbus installed, like the integration itself.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pymodbus  # noqa: E402
+
+from custom_components.fan_master.const import TRANSPORTS, DEFAULT_SCAN_INTERVAL  # noqa: E402
+from custom_components.fan_master.fanmaster import FanMaster  # noqa: E402
+from fanmaster_simulator import FanMasterSimulator  # noqa: E402
+
+_LOGGER = logging.getLogger(__name__)
+
+BASELINE_FILE = os.path.join(ROOT, "tools", "benchmark_baseline.json")
+SLAVE_COUNTS = [1, 2, 10, 30]
+#relative increase of the cycle wall time that counts as regression, request and byte counts must not grow at all
+WALL_TIME_TOLERANCE = 0.25
+
+
+class BenchmarkHass:
+    """The parts of Home Assistant the hub uses outside of a config entry."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.data = {}
+
+    def async_add_executor_job(self, target, *args):
+        return self.loop.run_in_executor(None, target, *args)
+
+    def async_create_task(self, target, name=None, eager_start=False):
+        return self.loop.create_task(target, name=name)
+
+    def async_create_background_task(self, target, name, eager_start=False):
+        return self.loop.create_task(target, name=name)
+
+
+class SimulatorThread:
+    """Runs the gateway simulator on an event loop in its own thread."""
+
+    def __init__(self, **kwargs):
+        self.simulator = FanMasterSimulator(**kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def start(self):
+        self._thread.start()
+        return self._run(self.simulator.async_start("127.0.0.1", 0))
+
+    def stop(self):
+        self._run(self.simulator.async_stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _async_statistics(self, reset):
+        statistics = {
+            "transactions": self.simulator.requests,
+            "bytes_sent": self.simulator.bytes_received,
+            "bytes_received": self.simulator.bytes_sent,
+            "cpu_time": time.thread_time(),
+        }
+        if reset:
+            self.simulator.reset_statistics()
+        return statistics
+
+    def statistics(self, reset=False):
+        """request and byte counters seen from the hub, cpu time of the simulator thread"""
+        return self._run(self._async_statistics(reset))
+
+    def update_values(self):
+        self._loop.call_soon_threadsafe(self.simulator.update_values)
+
+
+async def async_measure_cycle(hub, simulator):
+    """run one poll cycle and return its measurements"""
+    simulator.update_values()
+    before = simulator.statistics(reset=True)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await hub.async_read_modbus_data()
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    after = simulator.statistics()
+    return {
+        "transactions": after["transactions"],
+        "bytes_sent": after["bytes_sent"],
+        "bytes_received": after["bytes_received"],
+        "wall_time": wall_time,
+        "cpu_time": max(0.0, cpu_time - (after["cpu_time"] - before["cpu_time"])),
+    }
+
+
+def _mean(measurements):
+    return {key: sum(m[key] for m in measurements) / len(measurements) for key in measurements[0]}
+
+
+async def async_benchmark(transport, slaves, latency, cycles):
+    """benchmark one transport and number of fan devices"""
+    simulator = SimulatorThread(slaves=slaves, latency=latency, seed=slaves)
+    port = simulator.start()
+    hub = FanMaster(BenchmarkHass(), "benchmark", "127.0.0.1", port, 0, DEFAULT_SCAN_INTERVAL, slaves, transport)
+    try:
+        #the cycles are run here instead of by the interval timer of the first entity
+        await hub.async_connect()
+        initial = await async_measure_cycle(hub, simulator)
+        steady = [await async_measure_cycle(hub, simulator) for _ in range(cycles)]
+    finally:
+        await hub.async_close()
+        simulator.stop()
+
+    results = []
+    for phase, measurement in (("initial", initial), ("steady", _mean(steady))):
+        result = {"transport": transport, "slaves": slaves, "phase": phase}
+        result.update(measurement)
+        result["wall_time"] = round(result["wall_time"], 4)
+        result["cpu_time"] = round(result["cpu_time"], 4)
+        results.append(result)
+    return results
+
+
+def compare(results, baseline):
+    """return the regressions of the results against a baseline"""
+    reference = {(r["transport"], r["slaves"], r["phase"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = reference.get((result["transport"], result["slaves"], result["phase"]))
+        if base is None:
+            continue
+        name = f'{result["transport"]} {result["slaves"]} slaves {result["phase"]}'
+        for key in ("transactions", "bytes_sent", "bytes_received"):
+            if result[key] > base[key]:
+                regressions.append(f"{name}: {key} {base[key]} -> {result[key]}")
+        if result["wall_time"] > base["wall_time"] * (1 + WALL_TIME_TOLERANCE):
+            regressions.append(f'{name}: wall_time {base["wall_time"]}s -> {result["wall_time"]}s')
+    return regressions
+
+
+def print_results(results):
+    print(f'{"transport":<10} {"slaves":>6} {"phase":<8} {"transactions":>12} {"bytes out":>10} {"bytes in":>10} {"wall [s]":>9} {"cpu [s]":>9}')
+    for r in results:
+        print(f'{r["transport"]:<10} {r["slaves"]:>6} {r["phase"]:<8} {r["transactions"]:>12g} {r["bytes_sent"]:>10g} '
+              f'{r["bytes_received"]:>10g} {r["wall_time"]:>9.4f} {r["cpu_time"]:>9.4f}')
+
+
+async def _async_main(args):
+    results = []
+    for transport in args.transports:
+        for slaves in args.slaves:
+            results.extend(await async_benchmark(transport, slaves, args.latency, args.cycles))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan Master poll cycle benchmark")
+    parser.add_argument("--transports", nargs="+", default=TRANSPORTS, choices=TRANSPORTS)
+    parser.add_argument("--slaves", type=int, nargs="+", default=SLAVE_COUNTS)
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated latency per transaction [s]")
+    parser.add_argument("--cycles", type=int, default=5, help="number of measured steady cycles")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file")
+    parser.add_argument("--write-baseline", action="store_true", help="store the results as new baseline")
+    parser.add_argument("--compare", action="store_true", help="compare the results to the baseline, exit 1 on regressions")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(_async_main(args))
+    print_results(results)
+
+    if args.write_baseline:
+        baseline = {
+            "parameters": {
+                "latency": args.latency,
+                "cycles": args.cycles,
+                "python": platform.python_version(),
+                "pymodbus": pymodbus.__version__,
+            },
+            "results": results,
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["parameters"]["latency"] != args.latency:
+            print(f'warning: baseline was measured with latency {baseline["parameters"]["latency"]}s')
+        regressions = compare(results, baseline)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Fan Master gateway simulator.
+
+Modbus TCP server that emulates the register map of the Fan Master gateway
+(unit 0) and of up to 30 fan devices (units 1..30), so the integration can be
+run and measured without hardware:
+
+    python tools/fanmaster_simulator.py --port 5020 --slaves 30 --latency 0.05
+
+The simulator does not depend on pymodbus or Home Assistant. Requests of one
+connection are answered concurrently (pipelining) unless --serial is given.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import struct
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_DEVICES = 30
+MASTER_UNIT = 0
+
+#implemented registers, reads outside are answered with illegal data address
+MASTER_REGISTERS = list(range(0, 4)) + list(range(10, 12)) + list(range(20, 323))
+DEVICE_REGISTERS = list(range(0, 8)) + list(range(20, 23)) + list(range(30, 50))
+DEVICE_WRITABLE_REGISTERS = range(20, 23)
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+GATEWAY_TARGET_FAILED = 0x0B
+
+
+def _u16(value):
+    return value & 0xFFFF
+
+
+class FanMasterSimulator:
+    """Register image and Modbus TCP server of a simulated Fan Master gateway."""
+
+    def __init__(self, slaves=2, latency=0.0, jitter=0.0, sleeping=(), pipelining=True, seed=None):
+        """Initialize the simulator with the fan devices 1..slaves coded."""
+        self.latency = latency
+        self.jitter = jitter
+        self.pipelining = pipelining
+        self._random = random.Random(seed)
+        self._server = None
+        self._update_task = None
+        #connection handler task -> writer
+        self._connections = {}
+        self.master = {}
+        self.devices = {}
+        self.reset_statistics()
+
+        for unit in range(1, slaves + 1):
+            self.devices[unit] = self._initial_device_registers(unit, unit in sleeping)
+        self._init_master_registers()
+
+    def reset_statistics(self):
+        """Reset the request and byte counters."""
+        self.requests = 0
+        self.requests_per_function = {}
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+    def _initial_device_registers(self, unit, sleeping):
+        registers = dict.fromkeys(DEVICE_REGISTERS, 0)
+        registers[0] = 0x0102  #sw version 1.2.3
+        registers[1] = 0x0300
+        registers[4] = 1 if sleeping else 0
+        registers[5] = _u16(-60 - unit % 10)
+        registers[6] = _u16(-62 - unit % 10)
+        registers[7] = 200
+        registers[20] = 1  #auto
+        registers[21] = 50
+        registers[30] = 350 + unit
+        registers[31] = 352 + unit
+        registers[32] = 300 + unit
+        registers[33] = 210 + unit
+        registers[34] = 450
+        registers[35] = 90
+        for fan in range(11):
+            registers[36 + fan] = 1200 if fan < 4 else 65534  #fans 5..11 not attached
+        registers[47] = 60
+        registers[48] = 2  #heating
+        return registers
+
+    def _init_master_registers(self):
+        self.master = dict.fromkeys(MASTER_REGISTERS, 0)
+        #fbl 1.0.0, appl 2.1.0 in the upper 48 bits of registers 0..3, register 3 is the dtc status
+        self.master[0] = 0x0100
+        self.master[1] = 0x0002
+        self.master[2] = 0x0100
+        self.master[3] = 0
+        self.set_coding_list(self.devices.keys())
+        for unit in range(1, MAX_DEVICES + 1):
+            self.set_location(unit, f"Room {unit}" if unit in self.devices else "")
+        self._update_master_aggregates()
+
+    def set_coding_list(self, units, valid=True):
+        """Code the given units in the coding list (registers 10..11)."""
+        value = 0x80000000 if valid else 0
+        for unit in units:
+            value |= 1 << (unit - 1)
+        self.master[10] = value >> 16
+        self.master[11] = value & 0xFFFF
+
+    def set_location(self, unit, location):
+        """Set the location string (20 characters) of a fan device."""
+        raw = location.encode("utf-8")[:20].ljust(20, b"\0")
+        start = 20 + (unit - 1) * 10
+        for offset in range(10):
+            self.master[start + offset] = (raw[2 * offset] << 8) | raw[2 * offset + 1]
+
+    def set_sleeping(self, unit, sleeping):
+        """Let a fan device sleep or wake up."""
+        self.devices[unit][4] = 1 if sleeping else 0
+
+    def _update_master_aggregates(self):
+        if not self.devices:
+            self.master[320] = self.master[321] = 32767
+            return
+        dewpoints = [struct.unpack(">h", struct.pack(">H", registers[35]))[0] for registers in self.devices.values()]
+        supplies = [struct.unpack(">h", struct.pack(">H", registers[30]))[0] for registers in self.devices.values()]
+        self.master[320] = _u16(max(dewpoints))
+        self.master[321] = _u16(min(supplies))
+        self.master[322] = 1 if max(dewpoints) > min(supplies) else 0
+
+    def update_values(self):
+        """Let the measured values of all fan devices drift a little."""
+        for registers in self.devices.values():
+            if registers[4]:
+                continue
+            for address in (30, 31, 32, 33, 35):
+                registers[address] = _u16(struct.unpack(">h", struct.pack(">H", registers[address]))[0]
+                                          + self._random.choice((-1, 0, 0, 1)))
+            registers[34] = max(0, min(1000, registers[34] + self._random.choice((-2, 0, 2))))
+            registers[5] = _u16(struct.unpack(">h", struct.pack(">H", registers[5]))[0] + self._random.choice((-1, 0, 1)))
+            for address in range(36, 40):
+                registers[address] = max(0, registers[address] + self._random.choice((-15, 0, 15)))
+        self._update_master_aggregates()
+
+    def handle_pdu(self, unit, pdu):
+        """Process one request pdu and return the response pdu."""
+        function_code = pdu[0]
+        if unit == MASTER_UNIT:
+            registers, writable = self.master, ()
+        elif unit in self.devices:
+            registers, writable = self.devices[unit], DEVICE_WRITABLE_REGISTERS
+        else:
+            return bytes((function_code | 0x80, GATEWAY_TARGET_FAILED))
+
+        if function_code == 0x03:
+            address, count = struct.unpack(">HH", pdu[1:5])
+            if count < 1 or count > 125 or any(a not in registers for a in range(address, address + count)):
+                return bytes((function_code | 0x80, ILLEGAL_DATA_ADDRESS))
+            values = [registers[a] for a in range(address, address + count)]
+            return struct.pack(f">BB{count}H", function_code, 2 * count, *values)
+
+        if function_code == 0x06:
+            address, value = struct.unpack(">HH", pdu[1:5])
+            if address not in writable:
+                return bytes((function_code | 0x80, ILLEGAL_DATA_ADDRESS))
+            registers[address] = value
+            return pdu[:5]
+
+        if function_code == 0x10:
+            address, count, _byte_count = struct.unpack(">HHB", pdu[1:6])
+            values = struct.unpack(f">{count}H", pdu[6:6 + 2 * count])
+            if any(a not in writable for a in range(address, address + count)):
+                return bytes((function_code | 0x80, ILLEGAL_DATA_ADDRESS))
+            for offset, value in enumerate(values):
+                registers[address + offset] = value
+            return pdu[:5]
+
+        return bytes((function_code | 0x80, ILLEGAL_FUNCTION))
+
+    async def _async_answer(self, writer, transaction_id, unit, pdu):
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        response = self.handle_pdu(unit, pdu)
+        frame = struct.pack(">HHHB", transaction_id, 0, len(response) + 1, unit) + response
+        self.bytes_sent += len(frame)
+        if not writer.is_closing():
+            writer.write(frame)
+
+    async def _async_handle_connection(self, reader, writer):
+        self._connections[asyncio.current_task()] = writer
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                transaction_id, _protocol_id, length, unit = struct.unpack(">HHHB", header)
+                pdu = await reader.readexactly(length - 1)
+                self.requests += 1
+                self.requests_per_function[pdu[0]] = self.requests_per_function.get(pdu[0], 0) + 1
+                self.bytes_received += 7 + len(pdu)
+                answer = self._async_answer(writer, transaction_id, unit, pdu)
+                if self.pipelining:
+                    task = asyncio.create_task(answer)
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    await answer
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self._connections.pop(asyncio.current_task(), None)
+
+    async def async_start(self, host="127.0.0.1", port=5020, update_interval=None):
+        """Start serving, returns the bound port (use port 0 for a free port)."""
+        self._server = await asyncio.start_server(self._async_handle_connection, host, port)
+        if update_interval:
+            self._update_task = asyncio.create_task(self._async_update_values(update_interval))
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _async_update_values(self, update_interval):
+        while True:
+            await asyncio.sleep(update_interval)
+            self.update_values()
+
+    async def async_stop(self):
+        """Stop serving."""
+        if self._update_task is not None:
+            self._update_task.cancel()
+            self._update_task = None
+        if self._server is not None:
+            self._server.close()
+            #closing the connections ends their handlers with an incomplete read
+            handlers = list(self._connections)
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+
+async def _async_main(args):
+    simulator = FanMasterSimulator(
+        slaves=args.slaves,
+        latency=args.latency,
+        jitter=args.jitter,
+        sleeping=set(args.sleeping),
+        pipelining=not args.serial,
+    )
+    port = await simulator.async_start(args.host, args.port, args.update_interval)
+    _LOGGER.info(f"Fan Master simulator with {args.slaves} fan devices listening on {args.host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            _LOGGER.info(f"{simulator.requests} requests, {simulator.bytes_received} bytes in, {simulator.bytes_sent} bytes out")
+    finally:
+        await simulator.async_stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan Master Modbus TCP gateway simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--slaves", type=int, default=2, choices=range(0, MAX_DEVICES + 1), metavar="0..30",
+                        help="number of coded fan devices (units 1..n)")
+    parser.add_argument("--latency", type=float, default=0.0, help="delay of every response [s]")
+    parser.add_argument("--jitter", type=float, default=0.0, help="additional random delay of every response [s]")
+    parser.add_argument("--sleeping", type=int, nargs="*", default=[], help="units that report sleep")
+    parser.add_argument("--update-interval", type=float, default=5.0, help="interval of the value changes [s], 0 = static")
+    parser.add_argument("--serial", action="store_true", help="answer the requests of a connection one after another")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(_async_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()